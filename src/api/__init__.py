@@ -1,6 +1,6 @@
 # src/api/__init__.py
 from .base import APIAuthError, APIConnectionError, APIError, BaseAPIClient
-from .language_api import LanguageAPI, get_user_language_api
+from .language_api import LanguageAPI, get_language_api_for_settings, get_user_language_api
 
 __all__ = [
     "BaseAPIClient",
@@ -8,5 +8,6 @@ __all__ = [
     "APIAuthError",
     "APIConnectionError",
     "LanguageAPI",
+    "get_language_api_for_settings",
     "get_user_language_api",
 ]
@@ -1,6 +1,8 @@
 # src/api/base.py
 
+import asyncio
 import logging
+import time
 from typing import Any
 
 import aiohttp
@@ -36,23 +38,32 @@ class APIAuthError(APIError):
 class BaseAPIClient:
     """Базовый клиент для работы с внешним API"""
 
-    def __init__(self, base_url: str, headers: dict, timeout: int = 30, rate_limit_delay: float = 0.1):
+    def __init__(
+        self,
+        base_url: str,
+        headers: dict,
+        timeout: int = 30,
+        rate_limit_delay: float = 0.1,
+        session: aiohttp.ClientSession | None = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self.headers = headers
         self.timeout = aiohttp.ClientTimeout(total=timeout)
-        self._session: aiohttp.ClientSession | None = None
+        # Внешняя сессия (общий пул соединений) не закрывается клиентом - ей владеет вызывающий код
+        self._session = session
+        self._owns_session = session is None
         self.rate_limit_delay = rate_limit_delay  # Минимальное время между запросами (сек)
         self._last_request_time: float = 0.0
 
     async def _get_session(self) -> aiohttp.ClientSession:
         """Получить или создать HTTP сессию"""
-        if self._session is None or self._session.closed:
+        if self._owns_session and (self._session is None or self._session.closed):
             self._session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout)
         return self._session
 
     async def close(self):
-        """Закрыть HTTP сессию"""
-        if self._session and not self._session.closed:
+        """Закрыть HTTP сессию (только собственную)"""
+        if self._owns_session and self._session and not self._session.closed:
             await self._session.close()
 
     async def _request(
@@ -69,9 +80,6 @@ class BaseAPIClient:
         Rate limiting:
         - Минимальная задержка между запросами (по умолчанию 0.1 сек)
         """
-        import asyncio
-        import time
-
         # Rate limiting: проверяем время с последнего запроса
         if self._last_request_time > 0:
             elapsed = time.time() - self._last_request_time
@@ -95,7 +103,9 @@ class BaseAPIClient:
             async for attempt in retry_strategy:
                 with attempt:
                     session = await self._get_session()
-                    async with session.request(method, url, params=params, json=json) as response:
+                    async with session.request(
+                        method, url, params=params, json=json, headers=self.headers, timeout=self.timeout
+                    ) as response:
                         data = await response.json()
 
                         # Не делаем retry на ошибках авторизации
@@ -1,7 +1,9 @@
 # src/api/language_api.py
 
-
+import aiohttp
 from config import LANGUAGE_API_TIMEOUT, LANGUAGE_API_URL
+from db import UserLanguageSettings
+from sqlalchemy import select
 
 from .base import BaseAPIClient
 
@@ -9,18 +11,21 @@ from .base import BaseAPIClient
 class LanguageAPI(BaseAPIClient):
     """Клиент для Language Learning API"""
 
-    def __init__(self, user_token: str):
+    def __init__(self, user_token: str, session: aiohttp.ClientSession | None = None):
         """
         Инициализирует API клиент с токеном конкретного пользователя.
 
         Args:
             user_token: API токен пользователя (из UserLanguageSettings)
+            session: Общая HTTP сессия (пул соединений); если не передана, клиент создаст свою
         """
         headers = {
             "X-Telegram-Token": user_token,
             "Content-Type": "application/json",
         }
-        super().__init__(base_url=LANGUAGE_API_URL, headers=headers, timeout=LANGUAGE_API_TIMEOUT)
+        super().__init__(
+            base_url=LANGUAGE_API_URL, headers=headers, timeout=LANGUAGE_API_TIMEOUT, session=session
+        )
 
     # ===== BOOKS =====
 
@@ -83,26 +88,40 @@ class LanguageAPI(BaseAPIClient):
 
 
 # Helper function to get API client for specific user
-async def get_user_language_api(session, user_id: int) -> LanguageAPI | None:
+async def get_user_language_api(
+    session, user_id: int, http_session: aiohttp.ClientSession | None = None
+) -> LanguageAPI | None:
     """
     Получает API клиент для конкретного пользователя с его токеном.
 
     Args:
         session: Database session
         user_id: Telegram user ID
+        http_session: Общая HTTP сессия для переиспользования соединений (опционально)
 
     Returns:
         LanguageAPI instance or None if user has no token configured
     """
-    from db import UserLanguageSettings
-    from sqlalchemy import select
-
     result = await session.execute(
         select(UserLanguageSettings).where(UserLanguageSettings.user_id == user_id)
     )
-    settings = result.scalar_one_or_none()
+    return get_language_api_for_settings(result.scalar_one_or_none(), http_session)
+
+
+def get_language_api_for_settings(
+    settings, http_session: aiohttp.ClientSession | None = None
+) -> LanguageAPI | None:
+    """
+    Создаёт API клиент по уже загруженным настройкам пользователя (без запроса к БД).
 
+    Args:
+        settings: UserLanguageSettings или None
+        http_session: Общая HTTP сессия для переиспользования соединений (опционально)
+
+    Returns:
+        LanguageAPI instance or None if user has no token configured
+    """
     if not settings or not settings.api_token:
         return None
 
-    return LanguageAPI(user_token=settings.api_token)
+    return LanguageAPI(user_token=settings.api_token, session=http_session)
@@ -1,7 +1,9 @@
 # src/audio_service.py
 
+import asyncio
 import hashlib
 import logging
+import time
 from io import BytesIO
 from pathlib import Path
 
@@ -112,8 +114,6 @@ class AudioService:
                 logger.warning(f"Network error generating audio (attempt {attempt + 1}): {e}")
                 if attempt < max_retries:
                     # Exponential backoff
-                    import asyncio
-
                     await asyncio.sleep(2**attempt)
                     continue
                 else:
@@ -135,8 +135,6 @@ class AudioService:
         if not self.cache_dir.exists():
             return
 
-        import time
-
         deleted_count = 0
         for file_path in self.cache_dir.glob("*.mp3"):
             if older_than_days is not None:
@@ -1,9 +1,11 @@
 import asyncio
 
 from aiogram import Bot, Dispatcher
+from apscheduler.triggers.interval import IntervalTrigger
 from config import TELEGRAM_TOKEN, default_bot_properties, logger
 from db import init_db
 from handlers import router
+from llm_service import llm_service
 from middleware import RateLimitMiddleware
 from scheduler import ReminderScheduler
 
@@ -17,7 +19,8 @@ async def _main():
 
     # Регистрируем rate limiting middleware (защита от спама)
     # Лимит: 20 сообщений в минуту на пользователя
-    dp.message.middleware(RateLimitMiddleware(rate_limit=20, time_window=60))
+    rate_limiter = RateLimitMiddleware(rate_limit=20, time_window=60)
+    dp.message.middleware(rate_limiter)
 
     dp.include_router(router)
 
@@ -25,6 +28,14 @@ async def _main():
     scheduler = ReminderScheduler(bot)
     scheduler.start()
 
+    # Периодически очищаем rate limiter от неактивных пользователей
+    scheduler.scheduler.add_job(
+        rate_limiter.cleanup,
+        trigger=IntervalTrigger(seconds=rate_limiter.time_window),
+        id="rate_limit_cleanup",
+        replace_existing=True,
+    )
+
     # Планируем напоминания для всех пользователей
     await scheduler.reschedule_all_users()
 
@@ -36,6 +47,8 @@ async def _main():
     finally:
         # Останавливаем планировщик при завершении
         scheduler.shutdown()
+        await scheduler.close()
+        await llm_service.close()
         await bot.session.close()
 
 
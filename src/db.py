@@ -1,4 +1,5 @@
 # src/db.py
+import json
 from datetime import date, datetime, time
 
 from config import DATABASE_URL
@@ -9,14 +10,21 @@ from sqlalchemy import (
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     Time,
+    cast,
     func,
+    inspect,
+    literal,
+    select,
+    text,
 )
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
 class Base(DeclarativeBase): ...
@@ -179,18 +187,29 @@ class LanguageHabit(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    # Связи для загрузки в одном запросе с привычкой (joinedload/selectinload)
+    user: Mapped["User"] = relationship(viewonly=True)
+    settings: Mapped["UserLanguageSettings | None"] = relationship(
+        primaryjoin="LanguageHabit.user_id == foreign(UserLanguageSettings.user_id)",
+        viewonly=True,
+        uselist=False,
+    )
+
 
 class LanguageProgress(Base):
     """Ежедневный прогресс по языковой привычке"""
 
     __tablename__ = "language_progress"
+    # Одна запись в день на привычку (date хранит начало дня) - нужен для INSERT ... ON CONFLICT
+    __table_args__ = (Index("uq_language_progress_habit_date", "habit_id", "date", unique=True),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     habit_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("language_habits.id"), nullable=False, index=True
     )
 
-    date: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    # Начало локального дня пользователя в UTC (см. utils.local_day_bounds)
+    date: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     # Прогресс
     words_read: Mapped[int] = mapped_column(Integer, default=0)
@@ -208,8 +227,10 @@ class LanguageProgress(Base):
     questions_correct: Mapped[int] = mapped_column(Integer, default=0)  # Количество правильных ответов
     questions_total: Mapped[int] = mapped_column(Integer, default=0)  # Всего вопросов
 
-    # Дополнительные данные
-    extra_data: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    # Дополнительные данные (JSONB в PostgreSQL - для частичных обновлений через jsonb_set)
+    extra_data: Mapped[dict | None] = mapped_column(
+        JSON().with_variant(postgresql.JSONB(), "postgresql"), nullable=True
+    )
     completed: Mapped[bool] = mapped_column(Boolean, default=False)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -255,6 +276,78 @@ engine = create_async_engine(DATABASE_URL, echo=False)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
+def upsert(model):
+    """INSERT с поддержкой ON CONFLICT для диалекта текущей БД (PostgreSQL или SQLite)."""
+    insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    return insert(model)
+
+
+def json_set_key(column, key: str, value):
+    """
+    SQL-выражение, записывающее value по ключу key в JSON колонке на стороне БД.
+
+    Позволяет обновить один ключ без чтения и перезаписи всего документа из Python.
+    """
+    if engine.dialect.name == "postgresql":
+        return func.jsonb_set(
+            func.coalesce(cast(column, postgresql.JSONB), cast({}, postgresql.JSONB)),
+            cast(postgresql.array([key]), postgresql.ARRAY(Text)),
+            cast(value, postgresql.JSONB),
+            True,
+        )
+    return func.json_set(func.coalesce(column, "{}"), f"$.{key}", func.json(literal(json.dumps(value))))
+
+
+def language_progress_for_day(habit_id: int, day_start: datetime, day_end: datetime):
+    """
+    Запрос записи LanguageProgress за локальный день [day_start, day_end) (см. utils.local_day_bounds).
+
+    За один локальный день записей может быть несколько: после смены часового пояса начало дня
+    сдвигается, а старые записи хранят момент создания, а не начало дня. Поэтому берётся одна
+    запись: ровно на day_start (в неё пишут upsert-ы), иначе самая ранняя за день.
+    """
+    return (
+        select(LanguageProgress)
+        .where(
+            LanguageProgress.habit_id == habit_id,
+            LanguageProgress.date >= day_start,
+            LanguageProgress.date < day_end,
+        )
+        .order_by((LanguageProgress.date == day_start).desc(), LanguageProgress.date)
+        .limit(1)
+    )
+
+
+def _migrate_language_progress(sync_conn) -> None:
+    """
+    Приводит типы колонок language_progress в PostgreSQL к текущей модели.
+
+    create_all не меняет существующие таблицы: date была TIMESTAMP (наивное UTC время),
+    extra_data - JSON. Проверка по схеме, поэтому таблица перестраивается только один раз.
+    """
+    if sync_conn.dialect.name != "postgresql":
+        return  # SQLite не различает эти типы
+
+    columns = {
+        column["name"]: column["type"] for column in inspect(sync_conn).get_columns("language_progress")
+    }
+    if not getattr(columns["date"], "timezone", False):
+        sync_conn.execute(
+            text(
+                "ALTER TABLE language_progress "
+                "ALTER COLUMN date TYPE TIMESTAMP WITH TIME ZONE USING date AT TIME ZONE 'UTC'"
+            )
+        )
+    if not isinstance(columns["extra_data"], postgresql.JSONB):
+        sync_conn.execute(
+            text("ALTER TABLE language_progress ALTER COLUMN extra_data TYPE JSONB USING extra_data::jsonb")
+        )
+
+
 async def init_db() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate_language_progress)
+        # create_all не добавляет индексы в уже существующие таблицы
+        for index in LanguageProgress.__table__.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
@@ -1270,7 +1270,7 @@ async def habit_edit_title_start(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(StateFilter(EditHabitStates.edit_title))
-async def habit_edit_title_process(message: Message, state: FSMContext):
+async def habit_edit_title_process(message: Message, state: FSMContext, scheduler=None):
     """Обрабатывает новое название привычки."""
     new_title = message.text.strip()
     MAX_TITLE_LENGTH = 50
@@ -1294,6 +1294,10 @@ async def habit_edit_title_process(message: Message, state: FSMContext):
         habit.title = new_title
         await session.commit()
 
+    # Задания напоминаний хранят снимок привычки (в т.ч. название) - пересоздаём их
+    if scheduler:
+        await scheduler.schedule_user_reminders(user_id)
+
     await message.answer(f"Название изменено:\n" f"<s>{old_title}</s> → <b>{new_title}</b> ✅")
     await state.clear()
     logger.info(f"User {user_id} renamed habit {habit_id} from '{old_title}' to '{new_title}'")
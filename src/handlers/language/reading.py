@@ -1,7 +1,6 @@
 # src/handlers/language/reading.py
 
 import re
-from datetime import datetime
 
 from aiogram import F, Router
 from aiogram.enums import ParseMode
@@ -10,13 +9,21 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from api import APIAuthError, APIConnectionError, APIError, get_user_language_api
-from db import LanguageHabit, LanguageProgress, SessionLocal
+from db import (
+    LanguageHabit,
+    LanguageProgress,
+    SessionLocal,
+    json_set_key,
+    language_progress_for_day,
+    upsert,
+)
 from keyboards.language import (
     get_reading_actions_keyboard,
     get_reading_keyboard,
 )
-from sqlalchemy import func, select
-from utils import escape_html
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import joinedload
+from utils import escape_html, local_day_bounds
 
 
 def escape_markdown(text: str) -> str:
@@ -388,9 +395,9 @@ async def cmd_reading_progress(message: Message):
             return
 
         result = await session.execute(
-            select(LanguageHabit).where(
-                LanguageHabit.user_id == user_id, LanguageHabit.habit_type == "reading"
-            )
+            select(LanguageHabit)
+            .options(joinedload(LanguageHabit.user))
+            .where(LanguageHabit.user_id == user_id, LanguageHabit.habit_type == "reading")
         )
         habit = result.scalar_one_or_none()
 
@@ -405,15 +412,9 @@ async def cmd_reading_progress(message: Message):
             book = progress_data["book"]
             progress = progress_data["progress"]
 
-            # Локальный прогресс за сегодня
-            today = datetime.utcnow().date()
-            today_progress_result = await session.execute(
-                select(LanguageProgress).where(
-                    LanguageProgress.habit_id == habit.id,
-                    func.date(LanguageProgress.date) == today,
-                )
-            )
-            today_progress = today_progress_result.scalar_one_or_none()
+            # Локальный прогресс за сегодня (по часовому поясу пользователя)
+            day_start, day_end = local_day_bounds(habit.user.tz)
+            today_progress = await session.scalar(language_progress_for_day(habit.id, day_start, day_end))
 
             words_today = today_progress.words_read if today_progress else 0
 
@@ -454,7 +455,9 @@ async def callback_continue_reading(callback: CallbackQuery, state: FSMContext):
             return
 
         result = await session.execute(
-            select(LanguageHabit).where(
+            select(LanguageHabit)
+            .options(joinedload(LanguageHabit.user))
+            .where(
                 LanguageHabit.user_id == user_id,
                 LanguageHabit.habit_type == "reading",
                 LanguageHabit.is_active == True,  # noqa: E712
@@ -487,33 +490,25 @@ async def callback_continue_reading(callback: CallbackQuery, state: FSMContext):
             fragment_data["book_id"] = habit.current_book_id
             await state.update_data(current_fragment=fragment_data)
 
-            # Обновляем прогресс в БД
-            today = datetime.utcnow().date()
-            progress_result = await session.execute(
-                select(LanguageProgress).where(
-                    LanguageProgress.habit_id == habit.id,
-                    func.date(LanguageProgress.date) == today,
-                )
-            )
-            progress = progress_result.scalar_one_or_none()
-
-            if not progress:
-                progress = LanguageProgress(
+            # Обновляем статистику за сегодня одним INSERT ... ON CONFLICT
+            if not fragment_data.get("finished"):
+                words = len(fragment_data["fragment"]["text"].split())
+                day_start, _ = local_day_bounds(habit.user.tz)
+                stmt = upsert(LanguageProgress).values(
                     habit_id=habit.id,
-                    date=datetime.utcnow(),
-                    words_read=0,
-                    fragments_read=0,
-                    lessons_completed=0,
+                    date=day_start,
+                    words_read=words,
+                    fragments_read=1,
                 )
-                session.add(progress)
-
-            # Обновляем статистику
-            if not fragment_data.get("finished"):
-                fragment = fragment_data["fragment"]
-                progress.words_read = (progress.words_read or 0) + len(fragment["text"].split())
-                progress.fragments_read = (progress.fragments_read or 0) + 1
-
-            await session.commit()
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["habit_id", "date"],
+                    set_={
+                        "words_read": func.coalesce(LanguageProgress.words_read, 0) + words,
+                        "fragments_read": func.coalesce(LanguageProgress.fragments_read, 0) + 1,
+                    },
+                )
+                await session.execute(stmt)
+                await session.commit()
 
             # Показываем фрагмент
             await _display_fragment(callback.message, fragment_data, session, habit, state, user_id)
@@ -593,7 +588,9 @@ async def cmd_answer_questions(message: Message, state: FSMContext):
     async with SessionLocal() as session:
         # Get reading habit
         result = await session.execute(
-            select(LanguageHabit).where(
+            select(LanguageHabit)
+            .options(joinedload(LanguageHabit.user))
+            .where(
                 LanguageHabit.user_id == user_id,
                 LanguageHabit.habit_type == "reading",
                 LanguageHabit.is_active == True,  # noqa: E712
@@ -605,15 +602,9 @@ async def cmd_answer_questions(message: Message, state: FSMContext):
             await message.answer("📚 У вас нет активной привычки чтения")
             return
 
-        # Get today's progress
-        today = datetime.utcnow().date()
-        progress_result = await session.execute(
-            select(LanguageProgress).where(
-                LanguageProgress.habit_id == habit.id,
-                func.date(LanguageProgress.date) == today,
-            )
-        )
-        progress = progress_result.scalar_one_or_none()
+        # Get today's progress (user's local day)
+        day_start, day_end = local_day_bounds(habit.user.tz)
+        progress = await session.scalar(language_progress_for_day(habit.id, day_start, day_end))
 
         # Check if questions are available
         if not progress or not progress.questions_sent:
@@ -730,21 +721,19 @@ async def process_answer(message: Message, state: FSMContext):
 
         # Update progress in database
         async with SessionLocal() as session:
-            progress_id = data.get("progress_id")
-            result = await session.execute(select(LanguageProgress).where(LanguageProgress.id == progress_id))
-            progress = result.scalar_one_or_none()
-
-            if progress:
-                progress.questions_answered = True
-                progress.questions_correct = correct_count
-                progress.questions_total = total_count
-
-                # Store detailed answers
-                if progress.extra_data is None:
-                    progress.extra_data = {}
-                progress.extra_data["user_answers"] = answers
-
-                await session.commit()
+            # Store detailed answers (только ключ user_answers в extra_data)
+            await session.execute(
+                update(LanguageProgress)
+                .where(LanguageProgress.id == data.get("progress_id"))
+                .values(
+                    questions_answered=True,
+                    questions_correct=correct_count,
+                    questions_total=total_count,
+                    extra_data=json_set_key(LanguageProgress.extra_data, "user_answers", answers),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
 
         # Show final results
         percentage = (correct_count / total_count * 100) if total_count > 0 else 0
@@ -143,7 +143,7 @@ async def settings_tz_menu(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("SET_TZ:"))
-async def settings_tz_set(callback: CallbackQuery):
+async def settings_tz_set(callback: CallbackQuery, scheduler=None):
     """Устанавливает часовой пояс."""
     tz = callback.data.split("SET_TZ:")[1]
     user_id = callback.from_user.id
@@ -158,9 +158,12 @@ async def settings_tz_set(callback: CallbackQuery):
         user.tz = tz
         await session.commit()
 
+    # Пересоздаём задания пользователя, чтобы они получили актуальные настройки
+    if scheduler:
+        await scheduler.schedule_user_reminders(user_id)
+
     await callback.message.edit_text(
-        f"Готово! Часовой пояс изменён на <b>{tz}</b>.\n\n"
-        "Пересоздал расписание напоминаний (при следующем перезапуске бота)."
+        f"Готово! Часовой пояс изменён на <b>{tz}</b>.\n\n" "Расписание напоминаний обновлено."
     )
     await callback.answer()
     logger.info(f"User {user_id} changed timezone to {tz}")
@@ -204,7 +207,7 @@ async def settings_quiet_from_prompt(callback: CallbackQuery, state: FSMContext)
 
 
 @router.message(StateFilter(SettingsStates.edit_quiet_from))
-async def settings_quiet_from_save(message: Message, state: FSMContext):
+async def settings_quiet_from_save(message: Message, state: FSMContext, scheduler=None):
     """Сохраняет время начала тихих часов."""
     user_id = message.from_user.id
 
@@ -226,6 +229,10 @@ async def settings_quiet_from_save(message: Message, state: FSMContext):
             user.quiet_hours_from = time_value
             await session.commit()
 
+        # Пересоздаём задания пользователя, чтобы они получили актуальные настройки
+        if scheduler:
+            await scheduler.schedule_user_reminders(user_id)
+
         await message.answer(f"Готово! Начало тихих часов: <b>{time_value.strftime('%H:%M')}</b>")
         await state.clear()
         logger.info(f"User {user_id} set quiet_hours_from to {time_value}")
@@ -245,7 +252,7 @@ async def settings_quiet_to_prompt(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(StateFilter(SettingsStates.edit_quiet_to))
-async def settings_quiet_to_save(message: Message, state: FSMContext):
+async def settings_quiet_to_save(message: Message, state: FSMContext, scheduler=None):
     """Сохраняет время окончания тихих часов."""
     user_id = message.from_user.id
 
@@ -267,6 +274,10 @@ async def settings_quiet_to_save(message: Message, state: FSMContext):
             user.quiet_hours_to = time_value
             await session.commit()
 
+        # Пересоздаём задания пользователя, чтобы они получили актуальные настройки
+        if scheduler:
+            await scheduler.schedule_user_reminders(user_id)
+
         await message.answer(f"Готово! Конец тихих часов: <b>{time_value.strftime('%H:%M')}</b>")
         await state.clear()
         logger.info(f"User {user_id} set quiet_hours_to to {time_value}")
@@ -276,7 +287,7 @@ async def settings_quiet_to_save(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "SET_QUIET_OFF")
-async def settings_quiet_off(callback: CallbackQuery):
+async def settings_quiet_off(callback: CallbackQuery, scheduler=None):
     """Отключает тихие часы."""
     user_id = callback.from_user.id
 
@@ -291,6 +302,10 @@ async def settings_quiet_off(callback: CallbackQuery):
         user.quiet_hours_to = None
         await session.commit()
 
+    # Пересоздаём задания пользователя, чтобы они получили актуальные настройки
+    if scheduler:
+        await scheduler.schedule_user_reminders(user_id)
+
     await callback.message.edit_text("Готово! Тихие часы отключены.")
     await callback.answer()
     logger.info(f"User {user_id} disabled quiet hours")
@@ -327,7 +342,7 @@ async def settings_morning_time_prompt(callback: CallbackQuery, state: FSMContex
 
 
 @router.message(StateFilter(SettingsStates.edit_morning_ping))
-async def settings_morning_save(message: Message, state: FSMContext):
+async def settings_morning_save(message: Message, state: FSMContext, scheduler=None):
     """Сохраняет время утреннего пинга."""
     user_id = message.from_user.id
 
@@ -349,10 +364,11 @@ async def settings_morning_save(message: Message, state: FSMContext):
             user.morning_ping_time = time_value
             await session.commit()
 
-        await message.answer(
-            f"Готово! Утренний пинг установлен на <b>{time_value.strftime('%H:%M')}</b>\n\n"
-            "Расписание будет обновлено при следующем перезапуске бота."
-        )
+        # Пересоздаём задания пользователя, чтобы они получили актуальные настройки
+        if scheduler:
+            await scheduler.schedule_user_reminders(user_id)
+
+        await message.answer(f"Готово! Утренний пинг установлен на <b>{time_value.strftime('%H:%M')}</b>")
         await state.clear()
         logger.info(f"User {user_id} set morning_ping_time to {time_value}")
 
@@ -361,7 +377,7 @@ async def settings_morning_save(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "SET_MORNING_OFF")
-async def settings_morning_off(callback: CallbackQuery):
+async def settings_morning_off(callback: CallbackQuery, scheduler=None):
     """Отключает утренний пинг."""
     user_id = callback.from_user.id
 
@@ -375,6 +391,10 @@ async def settings_morning_off(callback: CallbackQuery):
         user.morning_ping_time = None
         await session.commit()
 
+    # Пересоздаём задания пользователя, чтобы они получили актуальные настройки
+    if scheduler:
+        await scheduler.schedule_user_reminders(user_id)
+
     await callback.message.edit_text("Готово! Утренний пинг отключён.")
     await callback.answer()
     logger.info(f"User {user_id} disabled morning ping")
@@ -413,7 +433,7 @@ async def settings_evening_time_prompt(callback: CallbackQuery, state: FSMContex
 
 
 @router.message(StateFilter(SettingsStates.edit_evening_ping))
-async def settings_evening_save(message: Message, state: FSMContext):
+async def settings_evening_save(message: Message, state: FSMContext, scheduler=None):
     """Сохраняет время вечернего отчёта."""
     user_id = message.from_user.id
 
@@ -435,10 +455,11 @@ async def settings_evening_save(message: Message, state: FSMContext):
             user.evening_ping_time = time_value
             await session.commit()
 
-        await message.answer(
-            f"Готово! Вечерний отчёт установлен на <b>{time_value.strftime('%H:%M')}</b>\n\n"
-            "Расписание будет обновлено при следующем перезапуске бота."
-        )
+        # Пересоздаём задания пользователя, чтобы они получили актуальные настройки
+        if scheduler:
+            await scheduler.schedule_user_reminders(user_id)
+
+        await message.answer(f"Готово! Вечерний отчёт установлен на <b>{time_value.strftime('%H:%M')}</b>")
         await state.clear()
         logger.info(f"User {user_id} set evening_ping_time to {time_value}")
 
@@ -447,7 +468,7 @@ async def settings_evening_save(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "SET_EVENING_OFF")
-async def settings_evening_off(callback: CallbackQuery):
+async def settings_evening_off(callback: CallbackQuery, scheduler=None):
     """Отключает вечерний отчёт."""
     user_id = callback.from_user.id
 
@@ -461,6 +482,10 @@ async def settings_evening_off(callback: CallbackQuery):
         user.evening_ping_time = None
         await session.commit()
 
+    # Пересоздаём задания пользователя, чтобы они получили актуальные настройки
+    if scheduler:
+        await scheduler.schedule_user_reminders(user_id)
+
     await callback.message.edit_text("Готово! Вечерний отчёт отключён.")
     await callback.answer()
     logger.info(f"User {user_id} disabled evening ping")
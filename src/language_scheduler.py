@@ -1,14 +1,36 @@
 """Language learning reminder scheduler jobs."""
 
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
+from datetime import datetime
+from functools import lru_cache
 
-from api.language_api import get_user_language_api
+from api.language_api import get_language_api_for_settings
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.triggers.cron import CronTrigger
 from audio_service import audio_service
 from config import logger
-from db import LanguageHabit, LanguageProgress, SessionLocal, User, UserLanguageSettings
-from sqlalchemy import func, select
+from db import (
+    LanguageHabit,
+    LanguageProgress,
+    SessionLocal,
+    User,
+    json_set_key,
+    language_progress_for_day,
+    upsert,
+)
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload, selectinload
+from utils import get_tz, local_day_bounds
+
+
+@lru_cache(maxsize=4096)
+def _cron(hour: int, minute: int, tz_name: str | None, day_of_week: str | None = None) -> CronTrigger:
+    """
+    Ежедневный (или по дням недели) CronTrigger в часовом поясе tz_name.
+
+    Триггер не хранит состояния, поэтому один экземпляр разделяют все задания с тем же
+    расписанием; ключ кэша - имя часового пояса, а не объект ZoneInfo.
+    """
+    return CronTrigger(hour=hour, minute=minute, day_of_week=day_of_week, timezone=get_tz(tz_name))
 
 
 class LanguageReminderService:
@@ -35,18 +57,14 @@ class LanguageReminderService:
                 logger.warning(f"User {user_id} not found for reading reminder scheduling")
                 return
 
+            # Существующее задание заменяется через replace_existing=True
             job_id = f"language_reading_{user_id}"
 
-            # Удаляем предыдущее задание, если есть
-            if self.scheduler.get_job(job_id):
-                self.scheduler.remove_job(job_id)
-
             # Парсим время
             hour, minute = map(int, reminder_time.split(":"))
 
-            # Создаём триггер с учётом часового пояса пользователя
-            tz = ZoneInfo(user.tz) if user.tz else ZoneInfo("UTC")
-            trigger = CronTrigger(hour=hour, minute=minute, timezone=tz)
+            # Триггер с учётом часового пояса пользователя
+            trigger = _cron(hour, minute, user.tz)
 
             self.scheduler.add_job(
                 self._send_reading_reminder,
@@ -61,9 +79,11 @@ class LanguageReminderService:
     async def _send_reading_reminder(self, user_id: int):
         """Отправляет напоминание о чтении."""
         async with SessionLocal() as session:
-            # Получаем привычку чтения
+            # Получаем привычку чтения (вместе с пользователем - нужен его часовой пояс)
             result = await session.execute(
-                select(LanguageHabit).where(
+                select(LanguageHabit)
+                .options(joinedload(LanguageHabit.user))
+                .where(
                     LanguageHabit.user_id == user_id,
                     LanguageHabit.habit_type == "reading",
                     LanguageHabit.is_active == True,  # noqa: E712
@@ -74,15 +94,9 @@ class LanguageReminderService:
             if not habit:
                 return
 
-            # Проверяем прогресс за сегодня
-            today = datetime.utcnow().date()
-            progress_result = await session.execute(
-                select(LanguageProgress).where(
-                    LanguageProgress.habit_id == habit.id,
-                    func.date(LanguageProgress.date) == today,
-                )
-            )
-            progress = progress_result.scalar_one_or_none()
+            # Проверяем прогресс за сегодня (локальный день пользователя)
+            day_start, day_end = local_day_bounds(habit.user.tz)
+            progress = await session.scalar(language_progress_for_day(habit.id, day_start, day_end))
 
             words_today = progress.words_read if progress else 0
             words_left = max(0, habit.daily_goal - words_today)
@@ -131,8 +145,11 @@ class LanguageReminderService:
     async def check_reading_streaks(self):
         """Проверяет streak для всех пользователей (запускается раз в день)."""
         async with SessionLocal() as session:
+            # Пользователи подгружаются одним дополнительным SELECT ... WHERE user_id IN (...)
             result = await session.execute(
-                select(LanguageHabit).where(
+                select(LanguageHabit)
+                .options(selectinload(LanguageHabit.user))
+                .where(
                     LanguageHabit.habit_type == "reading",
                     LanguageHabit.is_active == True,  # noqa: E712
                 )
@@ -140,17 +157,11 @@ class LanguageReminderService:
             habits = result.scalars().all()
 
             for habit in habits:
-                today = datetime.utcnow().date()
-                yesterday = today - timedelta(days=1)
-
-                # Проверяем вчерашний прогресс
-                yesterday_result = await session.execute(
-                    select(LanguageProgress).where(
-                        LanguageProgress.habit_id == habit.id,
-                        func.date(LanguageProgress.date) == yesterday,
-                    )
+                # Проверяем вчерашний прогресс (вчера - по локальному времени пользователя)
+                day_start, day_end = local_day_bounds(habit.user.tz, days_ago=1)
+                yesterday_progress = await session.scalar(
+                    language_progress_for_day(habit.id, day_start, day_end)
                 )
-                yesterday_progress = yesterday_result.scalar_one_or_none()
 
                 if yesterday_progress and yesterday_progress.words_read >= habit.daily_goal:
                     # Streak продолжается
@@ -182,9 +193,11 @@ class LanguageReminderService:
             f"language_questions_{user_id}",
         ]
         for job_id in job_ids:
-            if self.scheduler.get_job(job_id):
+            try:
                 self.scheduler.remove_job(job_id)
                 logger.info(f"Removed job {job_id}")
+            except JobLookupError:
+                pass  # Задания и не было
 
     # ===== AUDIO WORKFLOW (3-part: audio → text → questions) =====
 
@@ -210,14 +223,10 @@ class LanguageReminderService:
                 logger.warning(f"User {user_id} not found for audio workflow scheduling")
                 return
 
-            tz = ZoneInfo(user.tz) if user.tz else ZoneInfo("UTC")
-
-            # Remove old jobs
-            self.remove_language_jobs(user_id)
-
+            # All three jobs are re-added with replace_existing=True, no need to remove them first
             # Schedule audio (morning)
             audio_hour, audio_minute = map(int, audio_time.split(":"))
-            audio_trigger = CronTrigger(hour=audio_hour, minute=audio_minute, timezone=tz)
+            audio_trigger = _cron(audio_hour, audio_minute, user.tz)
             self.scheduler.add_job(
                 self._send_audio_fragment,
                 trigger=audio_trigger,
@@ -229,7 +238,7 @@ class LanguageReminderService:
 
             # Schedule reading (midday)
             reading_hour, reading_minute = map(int, reading_time.split(":"))
-            reading_trigger = CronTrigger(hour=reading_hour, minute=reading_minute, timezone=tz)
+            reading_trigger = _cron(reading_hour, reading_minute, user.tz)
             self.scheduler.add_job(
                 self._send_reading_reminder,
                 trigger=reading_trigger,
@@ -241,7 +250,7 @@ class LanguageReminderService:
 
             # Schedule questions (evening)
             questions_hour, questions_minute = map(int, questions_time.split(":"))
-            questions_trigger = CronTrigger(hour=questions_hour, minute=questions_minute, timezone=tz)
+            questions_trigger = _cron(questions_hour, questions_minute, user.tz)
             self.scheduler.add_job(
                 self._send_comprehension_questions,
                 trigger=questions_trigger,
@@ -254,9 +263,11 @@ class LanguageReminderService:
     async def _send_audio_fragment(self, user_id: int):
         """Отправляет аудио фрагмент для прослушивания (утро, за 1-2 часа до чтения)."""
         async with SessionLocal() as session:
-            # Get reading habit
+            # Get reading habit together with user and settings in one query
             habit_result = await session.execute(
-                select(LanguageHabit).where(
+                select(LanguageHabit)
+                .options(joinedload(LanguageHabit.user), joinedload(LanguageHabit.settings))
+                .where(
                     LanguageHabit.user_id == user_id,
                     LanguageHabit.habit_type == "reading",
                     LanguageHabit.is_active == True,  # noqa: E712
@@ -267,31 +278,21 @@ class LanguageReminderService:
                 logger.info(f"No active reading habit for user {user_id}, skipping audio")
                 return
 
-            # Get settings
-            settings_result = await session.execute(
-                select(UserLanguageSettings).where(UserLanguageSettings.user_id == user_id)
-            )
-            settings = settings_result.scalar_one_or_none()
+            settings = habit.settings
             if not settings or not settings.audio_enabled:
                 logger.info(f"Audio disabled for user {user_id}")
                 return
 
             # Get API client
-            api = await get_user_language_api(session, user_id)
+            api = get_language_api_for_settings(settings)
             if not api:
                 logger.warning(f"No API token for user {user_id}")
                 await self.bot.send_message(user_id, "❌ Не настроен API токен. Используйте /language_setup")
                 return
 
-            # Get or create today's progress
-            today = datetime.utcnow().date()
-            progress_result = await session.execute(
-                select(LanguageProgress).where(
-                    LanguageProgress.habit_id == habit.id,
-                    func.date(LanguageProgress.date) == today,
-                )
-            )
-            progress = progress_result.scalar_one_or_none()
+            # Get today's progress (user's local day)
+            day_start, day_end = local_day_bounds(habit.user.tz)
+            progress = await session.scalar(language_progress_for_day(habit.id, day_start, day_end))
 
             # Check if audio already sent today
             if progress and progress.audio_sent:
@@ -361,30 +362,27 @@ class LanguageReminderService:
 
                     await self.bot.send_message(user_id, fallback_message)
 
-                # Update progress
-                if not progress:
-                    progress = LanguageProgress(
-                        habit_id=habit.id,
-                        date=datetime.utcnow(),
-                        words_read=0,
-                        fragments_read=0,
-                        lessons_completed=0,
-                        audio_sent=False,
-                        text_sent=False,
-                        questions_sent=False,
-                        questions_answered=False,
-                        questions_correct=0,
-                        questions_total=0,
-                    )
-                    session.add(progress)
-
-                progress.audio_sent = True
-                progress.audio_sent_at = datetime.utcnow()
-                # Store fragment for later use
-                if progress.extra_data is None:
-                    progress.extra_data = {}
-                progress.extra_data["pending_fragment"] = fragment_data
-
+                # Update progress: одна атомарная вставка/обновление записи за сегодня
+                # (безопасно при параллельном запуске, фрагмент сохраняется для вопросов)
+                now = datetime.utcnow()
+                stmt = upsert(LanguageProgress).values(
+                    habit_id=habit.id,
+                    date=day_start,
+                    audio_sent=True,
+                    audio_sent_at=now,
+                    extra_data={"pending_fragment": fragment_data},
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["habit_id", "date"],
+                    set_={
+                        "audio_sent": True,
+                        "audio_sent_at": now,
+                        "extra_data": json_set_key(
+                            LanguageProgress.extra_data, "pending_fragment", fragment_data
+                        ),
+                    },
+                )
+                await session.execute(stmt)
                 await session.commit()
                 logger.info(f"Sent audio fragment to user {user_id}")
 
@@ -431,9 +429,11 @@ class LanguageReminderService:
     async def _send_comprehension_questions(self, user_id: int):
         """Отправляет вопросы на понимание прочитанного (вечер)."""
         async with SessionLocal() as session:
-            # Get reading habit
+            # Get reading habit together with user and settings in one query
             habit_result = await session.execute(
-                select(LanguageHabit).where(
+                select(LanguageHabit)
+                .options(joinedload(LanguageHabit.user), joinedload(LanguageHabit.settings))
+                .where(
                     LanguageHabit.user_id == user_id,
                     LanguageHabit.habit_type == "reading",
                     LanguageHabit.is_active == True,  # noqa: E712
@@ -443,15 +443,9 @@ class LanguageReminderService:
             if not habit or not habit.current_book_id:
                 return
 
-            # Get today's progress
-            today = datetime.utcnow().date()
-            progress_result = await session.execute(
-                select(LanguageProgress).where(
-                    LanguageProgress.habit_id == habit.id,
-                    func.date(LanguageProgress.date) == today,
-                )
-            )
-            progress = progress_result.scalar_one_or_none()
+            # Get today's progress (user's local day)
+            day_start, day_end = local_day_bounds(habit.user.tz)
+            progress = await session.scalar(language_progress_for_day(habit.id, day_start, day_end))
 
             # Check if text was sent and questions not yet sent
             if not progress or not progress.text_sent:
@@ -463,7 +457,7 @@ class LanguageReminderService:
                 return
 
             # Get API client
-            api = await get_user_language_api(session, user_id)
+            api = get_language_api_for_settings(habit.settings)
             if not api:
                 return
 
@@ -498,16 +492,18 @@ class LanguageReminderService:
 
                 await self.bot.send_message(user_id, message_text)
 
-                # Update progress
-                progress.questions_sent = True
-                progress.questions_sent_at = datetime.utcnow()
-                progress.questions_total = len(questions)
-
-                # Store questions for later checking
-                if progress.extra_data is None:
-                    progress.extra_data = {}
-                progress.extra_data["questions"] = questions
-
+                # Update progress, store questions for later checking (только ключ questions в extra_data)
+                await session.execute(
+                    update(LanguageProgress)
+                    .where(LanguageProgress.id == progress.id)
+                    .values(
+                        questions_sent=True,
+                        questions_sent_at=datetime.utcnow(),
+                        questions_total=len(questions),
+                        extra_data=json_set_key(LanguageProgress.extra_data, "questions", questions),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
                 await session.commit()
                 logger.info(f"Sent comprehension questions to user {user_id}")
 
@@ -1,11 +1,45 @@
 # src/llm_service.py
 
+import asyncio
+import json
 import os
+import random
+import re
+import ssl
+import time
 from datetime import datetime
 
+import aiohttp
 from config import logger
 from db import HabitContent, HabitTemplate, SessionLocal
-from sqlalchemy import select
+from sqlalchemy import select, update
+
+# Безопасный SSL контекст по умолчанию (с проверкой сертификатов), создаётся один раз
+_SSL_CONTEXT = ssl.create_default_context()
+
+# Базовые шаблоны для популярных привычек (fallback без LLM)
+_FALLBACKS: dict[str, tuple[str, ...]] = {
+    "зарядка": (
+        "10 приседаний\n5 отжиманий\n1 минута планка",
+        "15 приседаний\n10 отжиманий\n30 секунд планка",
+        "20 приседаний\n3 берпи\n1 минута растяжка",
+    ),
+    "чтение": (
+        "Прочитай 10 страниц книги",
+        "Почитай 15 минут перед сном",
+        "Прочитай одну главу",
+    ),
+    "медитация": (
+        "5 минут медитации с фокусом на дыхании",
+        "3 минуты осознанного дыхания",
+        "10 минут медитации в тишине",
+    ),
+    "вода": ("Выпей 2 стакана воды", "Выпей 500мл воды", "Выпей стакан воды прямо сейчас"),
+}
+
+# Одна регулярка на все ключевые слова: группа g{i} соответствует i-му ключевому слову
+_FALLBACK_RE = re.compile("|".join(f"(?P<g{i}>{re.escape(k)})" for i, k in enumerate(_FALLBACKS)))
+_FALLBACK_GROUPS: dict[str, tuple[str, ...]] = {f"g{i}": v for i, v in enumerate(_FALLBACKS.values())}
 
 
 class LLMService:
@@ -14,18 +48,51 @@ class LLMService:
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.model = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+        # Reasoning модели (gpt-5-nano) тратят часть лимита на рассуждения, поэтому запас большой
+        self.max_completion_tokens = int(os.getenv("LLM_MAX_COMPLETION_TOKENS", "5000"))
         self.use_llm = bool(self.api_key)
+        self._session: aiohttp.ClientSession | None = None
+        # Генерации в процессе по habit_id: параллельные вызовы ждут одну и ту же задачу
+        self._inflight: dict[int, asyncio.Task] = {}
+        # Последний полученный контент по habit_id: (time.monotonic() момента получения, запись)
+        self._cache: dict[int, tuple[float, HabitContent]] = {}
 
         if not self.use_llm:
             logger.warning("OPENAI_API_KEY not set - LLM features will use fallback content")
 
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Получить или создать HTTP сессию"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=_SSL_CONTEXT))
+        return self._session
+
+    async def close(self):
+        """Закрыть HTTP сессию"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    def get_cached_content(self, habit_id: int, max_age_seconds: int = 600) -> HabitContent | None:
+        """
+        Возвращает контент привычки, полученный не позднее max_age_seconds назад (без запросов к БД).
+
+        Используется напоминанием, чтобы забрать результат пре-генерации.
+        """
+        entry = self._cache.get(habit_id)
+        if entry is None:
+            return None
+
+        fetched_at, content = entry
+        if time.monotonic() - fetched_at > max_age_seconds:
+            return None
+        return content
+
     async def generate_habit_content(
         self,
         habit_id: int,
         habit_title: str,
         template: HabitTemplate | None = None,
         custom_prompt: str | None = None,
-    ) -> str:
+    ) -> HabitContent:
         """
         Генерирует контент для привычки.
 
@@ -36,8 +103,40 @@ class LLMService:
             custom_prompt: Кастомный промпт пользователя
 
         Returns:
-            Сгенерированный текст контента
+            Запись HabitContent с текстом контента (её id нужен для mark_content_used)
         """
+        # Если для привычки уже идёт генерация (напоминание + нажатие кнопки) - ждём её результат
+        task = self._inflight.get(habit_id)
+        if task is None:
+            task = asyncio.create_task(
+                self._generate_habit_content(habit_id, habit_title, template, custom_prompt)
+            )
+            self._inflight[habit_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(habit_id, None))
+
+        # shield: отмена одного ожидающего не отменяет генерацию для остальных
+        return await asyncio.shield(task)
+
+    async def _generate_habit_content(
+        self,
+        habit_id: int,
+        habit_title: str,
+        template: HabitTemplate | None,
+        custom_prompt: str | None,
+    ) -> HabitContent:
+        """Ищет сегодняшний контент в БД или генерирует и сохраняет новый (и запоминает его в памяти)"""
+        content = await self._find_or_generate_content(habit_id, habit_title, template, custom_prompt)
+        self._cache[habit_id] = (time.monotonic(), content)
+        return content
+
+    async def _find_or_generate_content(
+        self,
+        habit_id: int,
+        habit_title: str,
+        template: HabitTemplate | None,
+        custom_prompt: str | None,
+    ) -> HabitContent:
+        """Ищет сегодняшний контент в БД или генерирует и сохраняет новый"""
         # Проверяем, есть ли контент, сгенерированный сегодня (новый каждый день!)
         async with SessionLocal() as session:
             today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -52,7 +151,7 @@ class LLMService:
 
             if cached:
                 logger.info(f"Using today's cached content for habit {habit_id}")
-                return cached.content
+                return cached
 
         # Нет кэша - генерируем новый контент
         if self.use_llm:
@@ -61,17 +160,13 @@ class LLMService:
             content = self._generate_fallback(habit_title, template)
 
         # Сохраняем в БД
-        await self._save_content(habit_id, content)
-
-        return content
+        return await self._save_content(habit_id, content)
 
     async def _generate_with_llm(
         self, habit_title: str, template: HabitTemplate | None, custom_prompt: str | None
     ) -> str:
         """Генерирует контент через LLM API"""
         try:
-            import aiohttp
-
             # Формируем промпт
             if custom_prompt:
                 system_prompt = custom_prompt
@@ -94,34 +189,50 @@ class LLMService:
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_message},
                 ],
-                "max_completion_tokens": 5000,  # Increased for reasoning models like gpt-5-nano
+                "max_completion_tokens": self.max_completion_tokens,
+                "stream": True,
             }
 
-            # Используем безопасный SSL контекст по умолчанию
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.openai.com/v1/chat/completions", headers=headers, json=payload
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"LLM API error: {response.status} - {error_text}")
-                        return self._generate_fallback(habit_title, template)
+            session = await self._get_session()
+            async with session.post(
+                "https://api.openai.com/v1/chat/completions", headers=headers, json=payload
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"LLM API error: {response.status} - {error_text}")
+                    return self._generate_fallback(habit_title, template)
 
-                    data = await response.json()
-                    logger.info(f"OpenAI API response: {data}")
-                    content = data["choices"][0]["message"]["content"].strip()
+                content = (await self._read_stream(response)).strip()
 
-                    if not content:
-                        logger.warning(f"OpenAI returned empty content for '{habit_title}', using fallback")
-                        return self._generate_fallback(habit_title, template)
+                if not content:
+                    logger.warning(f"OpenAI returned empty content for '{habit_title}', using fallback")
+                    return self._generate_fallback(habit_title, template)
 
-                    logger.info(f"Generated LLM content for '{habit_title}': {content[:50]}...")
-                    return content
+                logger.info(f"Generated LLM content for '{habit_title}': {content[:50]}...")
+                return content
 
         except Exception as e:
             logger.error(f"Error generating LLM content: {e}")
             return self._generate_fallback(habit_title, template)
 
+    @staticmethod
+    async def _read_stream(response: aiohttp.ClientResponse) -> str:
+        """Собирает текст ответа из SSE потока (stream=True) по мере поступления чанков"""
+        parts: list[str] = []
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+
+            data = line[len("data:") :].strip()
+            if data == "[DONE]":
+                break
+
+            for choice in json.loads(data).get("choices") or []:
+                parts.append(choice.get("delta", {}).get("content") or "")
+
+        return "".join(parts)
+
     def _get_default_prompt(self, habit_title: str, template: HabitTemplate | None) -> str:
         """Возвращает дефолтный промпт в зависимости от категории"""
         if not template:
@@ -160,39 +271,15 @@ class LLMService:
 
     def _generate_fallback(self, habit_title: str, template: HabitTemplate | None) -> str:
         """Генерирует простой fallback контент без LLM"""
-        title_lower = habit_title.lower()
-
-        # Базовые шаблоны для популярных привычек
-        fallbacks = {
-            "зарядка": [
-                "10 приседаний\n5 отжиманий\n1 минута планка",
-                "15 приседаний\n10 отжиманий\n30 секунд планка",
-                "20 приседаний\n3 берпи\n1 минута растяжка",
-            ],
-            "чтение": [
-                "Прочитай 10 страниц книги",
-                "Почитай 15 минут перед сном",
-                "Прочитай одну главу",
-            ],
-            "медитация": [
-                "5 минут медитации с фокусом на дыхании",
-                "3 минуты осознанного дыхания",
-                "10 минут медитации в тишине",
-            ],
-            "вода": ["Выпей 2 стакана воды", "Выпей 500мл воды", "Выпей стакан воды прямо сейчас"],
-        }
-
         # Ищем подходящий шаблон
-        for keyword, templates in fallbacks.items():
-            if keyword in title_lower:
-                import random
-
-                return random.choice(templates)
+        match = _FALLBACK_RE.search(habit_title.lower())
+        if match:
+            return random.choice(_FALLBACK_GROUPS[match.lastgroup])
 
         # Дефолт
         return f"Выполни {habit_title}"
 
-    async def _save_content(self, habit_id: int, content: str) -> None:
+    async def _save_content(self, habit_id: int, content: str) -> HabitContent:
         """Сохраняет сгенерированный контент в БД"""
         async with SessionLocal() as session:
             habit_content = HabitContent(
@@ -201,23 +288,23 @@ class LLMService:
             session.add(habit_content)
             await session.commit()
             logger.info(f"Saved new content for habit {habit_id}")
+            return habit_content
 
-    async def mark_content_used(self, habit_id: int, content: str) -> None:
+    async def mark_content_used(self, content_id: int) -> None:
         """Отмечает, что контент был использован (показан пользователю)"""
         async with SessionLocal() as session:
+            # Один UPDATE ... RETURNING по первичному ключу вместо SELECT по тексту контента
             result = await session.execute(
-                select(HabitContent)
-                .where(HabitContent.habit_id == habit_id)
-                .where(HabitContent.content == content)
-                .order_by(HabitContent.generated_at.desc())
+                update(HabitContent)
+                .where(HabitContent.id == content_id)
+                .values(used_count=HabitContent.used_count + 1, last_used=datetime.now())
+                .returning(HabitContent.habit_id, HabitContent.used_count)
             )
-            habit_content = result.scalars().first()
+            row = result.one_or_none()
+            await session.commit()
 
-            if habit_content:
-                habit_content.used_count += 1
-                habit_content.last_used = datetime.now()
-                await session.commit()
-                logger.info(f"Marked content as for habit {habit_id}, count: {habit_content.used_count}")
+            if row:
+                logger.info(f"Marked content as used for habit {row.habit_id}, count: {row.used_count}")
 
 
 # Инициализация глобального сервиса
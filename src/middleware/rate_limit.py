@@ -1,7 +1,7 @@
 """Rate limiting middleware для защиты от спама."""
 
 import time
-from collections import defaultdict
+from collections import OrderedDict
 from collections.abc import Awaitable, Callable
 from typing import Any
 
@@ -14,20 +14,41 @@ class RateLimitMiddleware(BaseMiddleware):
     Middleware для ограничения частоты запросов от пользователей.
 
     Ограничение: не более rate_limit сообщений в time_window секунд.
+
+    Используется скользящее окно из двух счётчиков: число запросов в текущем
+    и предыдущем фиксированных окнах. Нагрузка оценивается как
+    prev * (доля предыдущего окна, попадающая в скользящее) + curr,
+    поэтому на пользователя хранятся только три целых числа.
+
+    Состояние хранится в LRU порядке и ограничено max_users записями.
     """
 
-    def __init__(self, rate_limit: int = 20, time_window: int = 60):
+    def __init__(self, rate_limit: int = 20, time_window: int = 60, max_users: int = 100_000):
         """
         Args:
             rate_limit: Максимальное количество сообщений
             time_window: Временное окно в секундах
+            max_users: Максимальное количество отслеживаемых пользователей
         """
         self.rate_limit = rate_limit
         self.time_window = time_window
+        self.max_users = max_users
 
-        self.user_requests: dict[int, list] = defaultdict(list)
+        # user_id -> (номер окна, запросов в предыдущем окне, запросов в текущем окне),
+        # от давно писавших к недавним
+        self.user_requests: OrderedDict[int, tuple[int, int, int]] = OrderedDict()
         super().__init__()
 
+    async def cleanup(self) -> None:
+        """Удаляет пользователей без запросов в текущем и предыдущем окне (запускается периодически)."""
+        window_idx = int(time.monotonic()) // self.time_window
+        # Записи упорядочены по последнему запросу, поэтому устаревшие находятся в начале
+        while self.user_requests:
+            stored_idx, _, _ = next(iter(self.user_requests.values()))
+            if stored_idx >= window_idx - 1:
+                break
+            self.user_requests.popitem(last=False)
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
@@ -36,22 +57,41 @@ class RateLimitMiddleware(BaseMiddleware):
     ) -> Any:
         """Проверяет rate limit перед выполнением хендлера."""
 
-        if not isinstance(event, Message):
+        # Middleware регистрируется на dp.message, поэтому callback-запросы сюда не попадают;
+        # проверка типа - дешёвая страховка на случай регистрации на другом уровне
+        if event.__class__ is not Message:
             return await handler(event, data)
 
         user_id = event.from_user.id
-        current_time = time.time()
+        # Монотонные часы не прыгают при синхронизации NTP; окна считаются в целых секундах
+        current_time = int(time.monotonic())
+        window_idx = current_time // self.time_window
+
+        state = self.user_requests.get(user_id)
+        if state is None:
+            state = (window_idx, 0, 0)
+        else:
+            self.user_requests.move_to_end(user_id)
 
-        user_timestamps = self.user_requests[user_id]
+        stored_idx, prev_count, curr_count = state
+        if stored_idx != window_idx:
+            # Началось новое окно: текущий счётчик становится предыдущим (если окна соседние)
+            prev_count = curr_count if stored_idx == window_idx - 1 else 0
+            curr_count = 0
 
-        user_timestamps[:] = [ts for ts in user_timestamps if current_time - ts < self.time_window]
+        elapsed = (current_time % self.time_window) / self.time_window
+        estimated = prev_count * (1 - elapsed) + curr_count
 
         # Проверяем, не превышен ли лимит
-        if len(user_timestamps) >= self.rate_limit:
+        if estimated >= self.rate_limit:
+            self.user_requests[user_id] = (window_idx, prev_count, curr_count)
             # Превышен лимит - отправляем предупреждение
             await event.reply("⚠️ Слишком много запросов. Пожалуйста, подождите немного.")
             return
 
-        user_timestamps.append(current_time)
+        self.user_requests[user_id] = (window_idx, prev_count, curr_count + 1)
+        if len(self.user_requests) > self.max_users:
+            # Вытесняем пользователя, который писал раньше всех
+            self.user_requests.popitem(last=False)
 
         return await handler(event, data)
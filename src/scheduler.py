@@ -1,13 +1,221 @@
 """Планировщик задач для отправки напоминаний о привычках и вечерних отчётов."""
 
-from datetime import datetime
-from zoneinfo import ZoneInfo
-
+import asyncio
+import re
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from time import time as unix_time
+from zoneinfo import ZoneInfoNotFoundError
+
+import aiohttp
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from api.language_api import get_user_language_api
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from config import logger
-from db import Habits, SessionLocal, User
-from sqlalchemy import select
+from db import (
+    HabitCompletion,
+    Habits,
+    HabitTemplate,
+    LanguageHabit,
+    SessionLocal,
+    Task,
+    User,
+    UserLanguageSettings,
+)
+from delegation_reminders import DelegationReminderService
+from language_scheduler import LanguageReminderService
+from llm_service import llm_service
+from sqlalchemy import Row, func, select
+from utils import format_date, get_phrase, get_tz
+
+
+# За сколько минут до напоминания пре-генерируется контент
+_PREGEN_LEAD_MINUTES = 5
+
+# Опорная дата для арифметики со временем суток (не date.min - вычитание из него переполняется)
+_ANCHOR_DATE = date(2000, 1, 1)
+
+
+def _shift_time(t: time, minutes: int) -> time:
+    """Сдвигает время суток на minutes минут (отрицательные - раньше) с переносом через полночь."""
+    return (datetime.combine(_ANCHOR_DATE, t) + timedelta(minutes=minutes)).time()
+
+
+# Дни недели RRULE -> формат CronTrigger (0=mon, 6=sun)
+_RRULE_DAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+_BYDAY_RE = re.compile(r"(?:^|;)BYDAY=([A-Z,]+)")
+
+
+@lru_cache(maxsize=1024)
+def _rrule_to_dow(rrule: str) -> str | None:
+    """
+    Извлекает дни недели из RRULE в формате day_of_week для CronTrigger.
+
+    Example:
+        >>> _rrule_to_dow("FREQ=WEEKLY;BYDAY=MO,WE,FR")
+        "0,2,4"
+    """
+    match = _BYDAY_RE.search(rrule)
+    if not match:
+        return None
+    return ",".join(str(_RRULE_DAYS[day]) for day in match.group(1).split(",") if day in _RRULE_DAYS) or None
+
+
+@lru_cache(maxsize=1024)
+def _prev_dow(day_of_week: str) -> str:
+    """
+    Сдвигает дни недели формата CronTrigger на день назад.
+
+    Example:
+        >>> _prev_dow("0,2,4")
+        "6,1,3"
+    """
+    return ",".join(str((int(day) - 1) % 7) for day in day_of_week.split(","))
+
+
+@lru_cache(maxsize=1024)
+def _dow_days(day_of_week: str) -> frozenset[int]:
+    """
+    Множество дней недели (0=mon, 6=sun) из формата CronTrigger.
+
+    Example:
+        >>> _dow_days("0,2,4")
+        frozenset({0, 2, 4})
+    """
+    return frozenset(int(day) for day in day_of_week.split(","))
+
+
+def _build_evening_markup() -> InlineKeyboardMarkup:
+    """Клавиатура вечернего отчёта (одинакова для всех пользователей)."""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="Заполню текстом ✍️", callback_data="J_ADD")
+    builder.button(text="Пропустить сегодня", callback_data="J_SKIP")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+_EVENING_MARKUP = _build_evening_markup()
+
+
+@lru_cache(maxsize=4096)
+def _habit_markup(habit_id: int, date_str: str) -> InlineKeyboardMarkup:
+    """Клавиатура напоминания о привычке; кэш сбрасывается ежедневно в полночь UTC."""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="Сделал ✅", callback_data=f"H_D:{habit_id}:{date_str}")
+    builder.button(text="Отложить 15м ⏰", callback_data=f"H_Z:{habit_id}:15")
+    builder.button(text="Пропустить ➖", callback_data=f"H_S:{habit_id}:{date_str}")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def _quiet_snapshot(user: User | Row) -> tuple[str | None, time | None, time | None]:
+    """
+    Снимок полей пользователя для проверки тихих часов: (tz, quiet_hours_from, quiet_hours_to).
+
+    Передаётся в args заданий, чтобы при срабатывании не перечитывать User из БД;
+    при изменении профиля задания пересоздаются через schedule_user_reminders.
+    """
+    return user.tz, user.quiet_hours_from, user.quiet_hours_to
+
+
+@dataclass(slots=True, frozen=True)
+class HabitSnapshot:
+    """
+    Снимок привычки и её владельца для заданий напоминания и пре-генерации.
+
+    Передаётся в args задания, поэтому при срабатывании пользователь и привычка
+    из БД не читаются; при изменении привычки или профиля задания пересоздаются
+    через schedule_user_reminders.
+    """
+
+    habit_id: int
+    user_id: int
+    title: str
+    time_of_day: time | None
+    include_content: bool
+    template_id: int | None
+    content_prompt: str | None
+    language_habit_id: int | None
+    tz: str | None
+    quiet_from: time | None
+    quiet_to: time | None
+
+    @classmethod
+    def from_models(cls, user: User | Row, habit: Habits) -> "HabitSnapshot":
+        return cls(
+            habit_id=habit.id,
+            user_id=user.user_id,
+            title=habit.title,
+            time_of_day=habit.time_of_day,
+            include_content=habit.include_content,
+            template_id=habit.template_id,
+            content_prompt=habit.content_prompt,
+            language_habit_id=habit.language_habit_id,
+            tz=user.tz,
+            quiet_from=user.quiet_hours_from,
+            quiet_to=user.quiet_hours_to,
+        )
+
+
+# Смещения часовых поясов кэшируются по 15-минутным интервалам UTC: переходы на летнее/зимнее
+# время происходят на их границах, поэтому внутри интервала смещение постоянно
+_OFFSET_BUCKET_SECONDS = 900
+
+
+@lru_cache(maxsize=1024)
+def _utc_offset_minutes(tz_name: str | None, bucket: int) -> int:
+    """Смещение часового пояса от UTC в минутах для интервала bucket (unix time // 900)."""
+    # fromtimestamp с tz переводит момент в местное время; utcoffset() от UTC-aware datetime
+    # ZoneInfo считал бы его местным и ошибался на величину смещения у переходов на летнее время
+    offset = datetime.fromtimestamp(bucket * _OFFSET_BUCKET_SECONDS, get_tz(tz_name)).utcoffset()
+    return int(offset.total_seconds()) // 60
+
+
+def _offset_at_minute(tz_name: str | None, minute: int) -> int:
+    """Смещение часового пояса от UTC в минутах для минуты minute от начала эпохи UTC."""
+    return _utc_offset_minutes(tz_name, minute * 60 // _OFFSET_BUCKET_SECONDS)
+
+
+# Поля пользователя, которые читает планирование напоминаний: при массовом перепланировании
+# выбираются только они (строки Row с теми же атрибутами, что у User), без загрузки ORM объектов
+_SCHEDULE_USER_COLUMNS = (
+    User.user_id,
+    User.first_name,
+    User.tz,
+    User.quiet_hours_from,
+    User.quiet_hours_to,
+    User.morning_ping_time,
+    User.evening_ping_time,
+)
+
+# Пользовательские напоминания устаревают через 5 минут (job_defaults), а ежедневные
+# служебные проверки выполняются раз в сутки - их стоит запустить даже с большим опозданием
+_DAILY_MISFIRE_GRACE = 3600
+
+# Глобальный лимит Bot API - около 30 сообщений в секунду: отправки из планировщика
+# начинаются не чаще раза в 1/30 секунды
+_SEND_INTERVAL = 1 / 30
+# Сколько раз пробуем отправить сообщение, если Telegram ответил flood control (429)
+_SEND_ATTEMPTS = 3
+
+# Сколько пропущенных минут (простой event loop, перезапуск задания) диспетчер догоняет -
+# столько же, сколько misfire_grace_time у пользовательских заданий
+_TICK_CATCHUP_MINUTES = 5
+
+
+@dataclass(slots=True, frozen=True)
+class _TickEntry:
+    """Запись минутного диспетчера: корутина, её аргументы и местные дни недели (None - каждый день)."""
+
+    callback: Callable[..., Awaitable[None]]
+    args: tuple
+    days: frozenset[int] | None = None
 
 
 class ReminderScheduler:
@@ -16,90 +224,164 @@ class ReminderScheduler:
     def __init__(self, bot):
         """Инициализирует планировщик с экземпляром бота."""
         self.bot = bot
-        self.scheduler = AsyncIOScheduler(timezone="UTC")
+        # После простоя бота пропущенные срабатывания одного задания схлопываются в одно,
+        # а опоздавшие не более чем на 5 минут всё ещё выполняются
+        self.scheduler = AsyncIOScheduler(
+            timezone="UTC",
+            job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 300},
+        )
+        # Индекс заданий по пользователю: user_id -> id его заданий (для remove_user_jobs)
+        self.user_jobs: dict[int, set[str]] = defaultdict(set)
+        # Пользовательские напоминания не заводятся отдельными заданиями APScheduler: одно
+        # ежеминутное задание _tick раздаёт их из корзин (tz, минута местных суток) -> {id: запись}
+        self._ticks: dict[tuple[str | None, int], dict[str, _TickEntry]] = defaultdict(dict)
+        # id записи -> её корзина (для замены и удаления без перебора корзин)
+        self._tick_slots: dict[str, tuple[str | None, int]] = {}
+        # Часовые пояса, в которых есть записи (со счётчиком записей) - их и проверяет _tick
+        self._tick_tzs: Counter[str | None] = Counter()
+        self._last_tick_minute: int | None = None
+        # Ссылки на запущенные пачки напоминаний, чтобы задачи не собрал GC
+        self._tick_tasks: set[asyncio.Task] = set()
+        # Общая HTTP сессия для Language API: соединения переиспользуются между напоминаниями
+        self._http: aiohttp.ClientSession | None = None
+        # Ограничение одновременных генераций LLM (все напоминания на одну минуту срабатывают разом)
+        self._llm_sema = asyncio.Semaphore(8)
+        # Время (часы event loop), раньше которого не начинается следующая отправка в Telegram:
+        # пачка тика уходит разом, а отправки выстраиваются с шагом _SEND_INTERVAL
+        self._next_send_at = 0.0
+        # Заранее полученный контент языковых привычек: (habit_id, YYYYMMDD) -> текст
+        self._content_cache: dict[tuple[int, str], str] = {}
 
     def start(self):
         """Запускает планировщик."""
         self.scheduler.start()
 
         # Планируем проверку делегированных задач каждый день в 09:00 UTC
-        from delegation_reminders import DelegationReminderService
-
         delegation_service = DelegationReminderService(self.bot)
         self.scheduler.add_job(
             delegation_service.check_and_send_reminders,
             trigger=CronTrigger(hour=9, minute=0, timezone="UTC"),
             id="delegation_reminders_check",
             replace_existing=True,
+            misfire_grace_time=_DAILY_MISFIRE_GRACE,
         )
 
         # Планируем проверку reading streaks каждый день в 00:30 UTC
-        from language_scheduler import LanguageReminderService
-
         language_service = LanguageReminderService(self.bot, self.scheduler)
         self.scheduler.add_job(
             language_service.check_reading_streaks,
             trigger=CronTrigger(hour=0, minute=30, timezone="UTC"),
             id="language_streaks_check",
             replace_existing=True,
+            misfire_grace_time=_DAILY_MISFIRE_GRACE,
+        )
+
+        # Диспетчер пользовательских напоминаний - в начале каждой минуты
+        self.scheduler.add_job(
+            self._tick,
+            trigger=CronTrigger(minute="*", timezone="UTC"),
+            id="reminder_tick",
+            replace_existing=True,
+        )
+
+        # Клавиатуры и заготовленный контент привязаны к дате, поэтому вчерашние больше не понадобятся
+        self.scheduler.add_job(
+            self._reset_daily_caches,
+            trigger=CronTrigger(hour=0, minute=0, timezone="UTC"),
+            id="habit_markup_cache_clear",
+            replace_existing=True,
+            misfire_grace_time=_DAILY_MISFIRE_GRACE,
         )
 
         logger.info("Scheduler started with delegation and language reminders")
 
+    def _reset_daily_caches(self):
+        """Сбрасывает кэши, привязанные к дате (клавиатуры и заготовленный контент)."""
+        _habit_markup.cache_clear()
+        # Контент, заготовленный перед полуночью для напоминаний 00:00-00:04, уже помечен сегодняшней
+        # датой и ещё не отправлен: его потеря сдвинула бы чтение на лишний фрагмент. Удаляем только
+        # записи за прошедшие дни
+        today_str = format_date(date.today(), "YYYYMMDD")
+        self._content_cache = {
+            key: content for key, content in self._content_cache.items() if key[1] >= today_str
+        }
+
     def shutdown(self):
         """Останавливает планировщик."""
         self.scheduler.shutdown()
         logger.info("Scheduler stopped")
 
+    async def _get_http(self) -> aiohttp.ClientSession:
+        """Получить или создать общую HTTP сессию"""
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(limit=100, keepalive_timeout=60)
+            self._http = aiohttp.ClientSession(connector=connector)
+        return self._http
+
+    async def close(self):
+        """Закрыть общую HTTP сессию"""
+        if self._http and not self._http.closed:
+            await self._http.close()
+
     async def schedule_user_reminders(self, user_id: int):
         """Планирует все напоминания для конкретного пользователя."""
         async with SessionLocal() as session:
-            # Получаем пользователя
-            result = await session.execute(select(User).where(User.user_id == user_id))
-            user = result.scalar_one_or_none()
-            if not user:
-                logger.warning(f"User {user_id} not found for scheduling")
-                return
+            # Пользователь и его активные привычки одним запросом (без привычек - одна строка с None)
+            result = await session.execute(
+                select(User, Habits)
+                .outerjoin(Habits, (Habits.user_id == User.user_id) & Habits.active.is_(True))
+                .where(User.user_id == user_id)
+            )
+            rows = result.all()
 
-            # Планируем утренний пинг
-            if user.morning_ping_time:
-                await self._schedule_morning_ping(user)
+        if not rows:
+            logger.warning(f"User {user_id} not found for scheduling")
+            return
 
-            # Планируем вечерний отчёт
-            if user.evening_ping_time:
-                await self._schedule_evening_report(user)
+        user = rows[0][0]
+        habits = [habit for _, habit in rows if habit is not None]
 
-            # Планируем напоминания о привычках
-            result = await session.execute(
-                select(Habits).where(Habits.user_id == user_id, Habits.active.is_(True))
-            )
-            habits = result.scalars().all()
+        await self._schedule_user_reminders_prefetched(user, habits)
 
-            for habit in habits:
-                await self._schedule_habit_reminder(user, habit)
+    async def _schedule_user_reminders_prefetched(self, user: User | Row, habits: list[Habits]):
+        """Планирует напоминания по уже загруженным пользователю и его привычкам (без запросов к БД)."""
+        # Планируем утренний пинг (отключённый - снимаем с расписания)
+        if user.morning_ping_time:
+            await self._schedule_morning_ping(user)
+        else:
+            self._discard_jobs(user.user_id, f"morning_ping_uid{user.user_id}")
 
-        logger.info(f"Scheduled reminders for user {user_id}")
+        # Планируем вечерний отчёт
+        if user.evening_ping_time:
+            await self._schedule_evening_report(user)
+        else:
+            self._discard_jobs(user.user_id, f"evening_report_uid{user.user_id}")
 
-    async def _schedule_morning_ping(self, user: User):
-        """Планирует утренний пинг для пользователя."""
-        job_id = f"morning_ping_{user.user_id}"
+        # Снимаем задания удалённых и выключенных привычек (их нет среди активных)
+        active_ids = {str(habit.id) for habit in habits}
+        stale = [
+            job_id
+            for job_id in self.user_jobs.get(user.user_id, ())
+            if job_id.startswith(("habit_", "pregen_")) and job_id.split("_")[1] not in active_ids
+        ]
+        if stale:
+            self._discard_jobs(user.user_id, *stale)
 
-        # Удаляем предыдущее задание, если есть
-        if self.scheduler.get_job(job_id):
-            self.scheduler.remove_job(job_id)
+        # Планируем напоминания о привычках
+        for habit in habits:
+            await self._schedule_habit_reminder(user, habit)
 
-        # Создаём триггер с учётом часового пояса пользователя
-        tz = ZoneInfo(user.tz) if user.tz else ZoneInfo("UTC")
-        trigger = CronTrigger(
-            hour=user.morning_ping_time.hour, minute=user.morning_ping_time.minute, timezone=tz
-        )
+        logger.info(f"Scheduled reminders for user {user.user_id}")
 
-        self.scheduler.add_job(
-            self._send_morning_ping,
-            trigger=trigger,
-            id=job_id,
-            args=[user.user_id],
-            replace_existing=True,
+    async def _schedule_morning_ping(self, user: User | Row):
+        """Планирует утренний пинг для пользователя."""
+        # Минута срабатывания считается в часовом поясе пользователя
+        self._tick_add(
+            user.user_id,
+            f"morning_ping_uid{user.user_id}",
+            user.tz,
+            user.morning_ping_time,
+            _TickEntry(self._send_morning_ping, (user.user_id, user.first_name, *_quiet_snapshot(user))),
         )
 
         logger.info(
@@ -107,24 +389,14 @@ class ReminderScheduler:
             f"{user.morning_ping_time.strftime('%H:%M')} {user.tz}"
         )
 
-    async def _schedule_evening_report(self, user: User):
+    async def _schedule_evening_report(self, user: User | Row):
         """Планирует вечерний отчёт для пользователя."""
-        job_id = f"evening_report_{user.user_id}"
-
-        if self.scheduler.get_job(job_id):
-            self.scheduler.remove_job(job_id)
-
-        tz = ZoneInfo(user.tz) if user.tz else ZoneInfo("UTC")
-        trigger = CronTrigger(
-            hour=user.evening_ping_time.hour, minute=user.evening_ping_time.minute, timezone=tz
-        )
-
-        self.scheduler.add_job(
-            self._send_evening_report,
-            trigger=trigger,
-            id=job_id,
-            args=[user.user_id],
-            replace_existing=True,
+        self._tick_add(
+            user.user_id,
+            f"evening_report_uid{user.user_id}",
+            user.tz,
+            user.evening_ping_time,
+            _TickEntry(self._send_evening_report, (user.user_id, *_quiet_snapshot(user))),
         )
 
         logger.info(
@@ -132,346 +404,314 @@ class ReminderScheduler:
             f"{user.evening_ping_time.strftime('%H:%M')} {user.tz}"
         )
 
-    async def _schedule_habit_reminder(self, user: User, habit: Habits):
+    async def _schedule_habit_reminder(self, user: User | Row, habit: Habits):
         """Планирует напоминание о конкретной привычке."""
+        job_id = f"habit_{habit.id}_uid{user.user_id}"
+        pregen_job_id = f"pregen_{habit.id}_uid{user.user_id}"
+
         if not habit.time_of_day or not habit.active:
+            self._discard_jobs(user.user_id, job_id, pregen_job_id)
             return
 
-        job_id = f"habit_{habit.id}_user_{user.user_id}"
-        pregen_job_id = f"pregen_{habit.id}_user_{user.user_id}"
-
-        if self.scheduler.get_job(job_id):
-            self.scheduler.remove_job(job_id)
+        snapshot = HabitSnapshot.from_models(user, habit)
 
-        if self.scheduler.get_job(pregen_job_id):
-            self.scheduler.remove_job(pregen_job_id)
+        # Существующие записи заменяются в _tick_add;
+        # удалять нужно только те, что больше не будут запланированы
 
-        tz = ZoneInfo(user.tz) if user.tz else ZoneInfo("UTC")
+        # Время пре-генерации контента за 5 минут до напоминания
+        pregen_t = _shift_time(habit.time_of_day, -_PREGEN_LEAD_MINUTES)
 
-        # Парсим расписание привычки
-        trigger = None
-        pregen_trigger = None
+        # Дни недели по расписанию привычки (None - каждый день)
+        days = None
+        pregen_days = None
 
-        if habit.schedule_type == "daily":
-            trigger = CronTrigger(hour=habit.time_of_day.hour, minute=habit.time_of_day.minute, timezone=tz)
-
-            # Триггер для пре-генерации контента за 5 минут до напоминания
-            pregen_hour = habit.time_of_day.hour
-            pregen_minute = habit.time_of_day.minute - 5
-
-            # Обработка переноса часа (если минуты уходят в отрицательные)
-            if pregen_minute < 0:
-                pregen_minute += 60
-                pregen_hour -= 1
-                if pregen_hour < 0:
-                    pregen_hour += 24
-
-            pregen_trigger = CronTrigger(hour=pregen_hour, minute=pregen_minute, timezone=tz)
-        elif habit.schedule_type == "weekly":
+        if habit.schedule_type == "weekly":
             # Парсим RRULE для получения дней недели
             # Формат: "FREQ=WEEKLY;BYDAY=MO,WE,FR"
+            # Если нет RRULE, считаем что каждый день (fallback)
             if habit.rrule:
-                try:
-                    # Извлекаем дни недели из RRULE
-                    byday_part = [part for part in habit.rrule.split(";") if part.startswith("BYDAY=")]
-                    if byday_part:
-                        days_str = byday_part[0].split("=")[1]
-                        # Конвертируем MO,WE,FR в формат для CronTrigger (0=mon, 6=sun)
-                        days_map = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
-                        day_of_week = ",".join(
-                            [str(days_map[day]) for day in days_str.split(",") if day in days_map]
-                        )
-
-                        trigger = CronTrigger(
-                            day_of_week=day_of_week,
-                            hour=habit.time_of_day.hour,
-                            minute=habit.time_of_day.minute,
-                            timezone=tz,
-                        )
-
-                        # Триггер для пре-генерации (тот же день недели, но за 5 минут до)
-                        pregen_hour = habit.time_of_day.hour
-                        pregen_minute = habit.time_of_day.minute - 5
-
-                        if pregen_minute < 0:
-                            pregen_minute += 60
-                            pregen_hour -= 1
-                            if pregen_hour < 0:
-                                pregen_hour += 24
-
-                        pregen_trigger = CronTrigger(
-                            day_of_week=day_of_week,
-                            hour=pregen_hour,
-                            minute=pregen_minute,
-                            timezone=tz,
-                        )
-                except Exception as e:
-                    logger.error(f"Failed to parse RRULE for habit {habit.id}: {e}")
+                # Извлекаем дни недели из RRULE (результат кэшируется по строке RRULE)
+                day_of_week = _rrule_to_dow(habit.rrule)
+                if not day_of_week:
+                    logger.error(f"Failed to parse RRULE for habit {habit.id}: {habit.rrule}")
+                    self._discard_jobs(user.user_id, job_id, pregen_job_id)
                     return
-            else:
-                # Если нет RRULE, считаем что каждый день (fallback)
-                trigger = CronTrigger(
-                    hour=habit.time_of_day.hour, minute=habit.time_of_day.minute, timezone=tz
-                )
-
-                pregen_hour = habit.time_of_day.hour
-                pregen_minute = habit.time_of_day.minute - 5
 
-                if pregen_minute < 0:
-                    pregen_minute += 60
-                    pregen_hour -= 1
-                    if pregen_hour < 0:
-                        pregen_hour += 24
+                days = _dow_days(day_of_week)
+                # Пре-генерация за 5 минут до; если это переносит её через полночь,
+                # она должна сработать накануне
+                pregen_days = _dow_days(_prev_dow(day_of_week)) if pregen_t > habit.time_of_day else days
+        elif habit.schedule_type != "daily":
+            self._discard_jobs(user.user_id, job_id, pregen_job_id)
+            return
 
-                pregen_trigger = CronTrigger(hour=pregen_hour, minute=pregen_minute, timezone=tz)
+        self._tick_add(
+            user.user_id,
+            job_id,
+            user.tz,
+            habit.time_of_day,
+            _TickEntry(self._send_habit_reminder, (snapshot,), days),
+        )
 
-        if trigger:
-            self.scheduler.add_job(
-                self._send_habit_reminder,
-                trigger=trigger,
-                id=job_id,
-                args=[user.user_id, habit.id],
-                replace_existing=True,
+        # Планируем пре-генерацию контента только если привычка требует контент
+        if habit.include_content:
+            self._tick_add(
+                user.user_id,
+                pregen_job_id,
+                user.tz,
+                pregen_t,
+                _TickEntry(self._pregenerate_habit_content, (snapshot,), pregen_days),
             )
-
-            # Планируем пре-генерацию контента только если привычка требует контент
-            if pregen_trigger and habit.include_content:
-                self.scheduler.add_job(
-                    self._pregenerate_habit_content,
-                    trigger=pregen_trigger,
-                    id=pregen_job_id,
-                    args=[habit.id],
-                    replace_existing=True,
-                )
-                logger.info(
-                    f"Scheduled content pre-generation for habit '{habit.title}' (ID {habit.id}) "
-                    f"at {pregen_hour:02d}:{pregen_minute:02d} {user.tz}"
-                )
-
-            schedule_info = f"{habit.schedule_type}"
-            if habit.schedule_type == "weekly" and habit.rrule:
-                schedule_info += f" ({habit.rrule})"
-
             logger.info(
-                f"Scheduled habit '{habit.title}' for user {user.user_id} at "
-                f"{habit.time_of_day.strftime('%H:%M')} {user.tz} - {schedule_info}"
+                f"Scheduled content pre-generation for habit '{habit.title}' (ID {habit.id}) "
+                f"at {pregen_t.strftime('%H:%M')} {user.tz}"
             )
+        else:
+            self._discard_jobs(user.user_id, pregen_job_id)
 
-    async def _pregenerate_habit_content(self, habit_id: int):
-        """Пре-генерирует контент для привычки за 5 минут до напоминания."""
-        from db import HabitTemplate
-        from llm_service import llm_service
+        schedule_info = f"{habit.schedule_type}"
+        if habit.schedule_type == "weekly" and habit.rrule:
+            schedule_info += f" ({habit.rrule})"
 
-        async with SessionLocal() as session:
-            habit = await session.get(Habits, habit_id)
+        logger.info(
+            f"Scheduled habit '{habit.title}' for user {user.user_id} at "
+            f"{habit.time_of_day.strftime('%H:%M')} {user.tz} - {schedule_info}"
+        )
 
-            if not habit or not habit.active or not habit.include_content:
-                return
+    async def _pregenerate_habit_content(self, habit: HabitSnapshot):
+        """Пре-генерирует контент для привычки за 5 минут до напоминания."""
+        if not habit.include_content:
+            return
 
-            try:
-                # Получаем шаблон, если он есть
-                template = None
-                if habit.template_id:
-                    template = await session.get(HabitTemplate, habit.template_id)
+        try:
+            # Из БД нужен только шаблон (пользователь и привычка - в снимке)
+            template = await self._load_template(habit.template_id)
+
+            # Для языковых привычек заранее получаем фрагмент из Language API,
+            # чтобы напоминание не ждало внешний HTTP запрос
+            if template and template.category in ("language_reading", "language_grammar"):
+                # Получение фрагмента сдвигает прогресс чтения - не тратим его впустую
+                if self._is_quiet_hours(habit.tz, habit.quiet_from, habit.quiet_to):
+                    return
 
-                # Пропускаем пре-генерацию для языковых привычек
-                # (контент будет получен из Language API в момент отправки)
-                if template and template.category in ("language_reading", "language_grammar"):
-                    logger.info(
-                        f"Skipping pre-generation for language habit {habit_id} "
-                        f"('{habit.title}') - content will be fetched from API"
+                async with SessionLocal() as session:
+                    content = await self._get_language_content(
+                        session, habit.user_id, habit.language_habit_id
                     )
-                    return
+                # Сообщения об ошибках не кэшируем - при отправке будет ещё одна попытка
+                if not content.startswith(("⚠️", "❌")):
+                    # Ключ - дата отправки напоминания (для напоминания сразу после полуночи - завтрашняя)
+                    send_date = (datetime.now() + timedelta(minutes=_PREGEN_LEAD_MINUTES)).date()
+                    self._content_cache[(habit.habit_id, format_date(send_date, "YYYYMMDD"))] = content
+                    logger.info(f"Pre-fetched language content for habit {habit.habit_id} ('{habit.title}')")
+                return
 
-                # Генерируем контент заранее для обычных привычек
-                content = await llm_service.generate_habit_content(
-                    habit_id=habit.id,
+            # Генерируем контент заранее для обычных привычек
+            async with self._llm_sema:
+                habit_content = await llm_service.generate_habit_content(
+                    habit_id=habit.habit_id,
                     habit_title=habit.title,
                     template=template,
                     custom_prompt=habit.content_prompt,
                 )
 
-                logger.info(
-                    f"Pre-generated content for habit {habit_id} ('{habit.title}'): " f"{content[:50]}..."
-                )
-            except Exception as e:
-                logger.error(f"Failed to pre-generate content for habit {habit_id}: {e}")
-
-    async def _send_morning_ping(self, user_id: int):
-        """Отправляет утренний пинг пользователю."""
-        from utils import get_phrase
-
-        async with SessionLocal() as session:
-            result = await session.execute(select(User).where(User.user_id == user_id))
-            user = result.scalar_one_or_none()
-            if not user:
-                return
-
-            # Проверяем тихие часы
-            if await self._is_quiet_hours(user):
-                logger.info(f"Skipping morning ping for user {user_id} - quiet hours")
-                return
+            logger.info(
+                f"Pre-generated content for habit {habit.habit_id} ('{habit.title}'): "
+                f"{habit_content.content[:50]}..."
+            )
+        except Exception as e:
+            logger.error(f"Failed to pre-generate content for habit {habit.habit_id}: {e}")
+
+    async def _send_morning_ping(
+        self,
+        user_id: int,
+        first_name: str,
+        tz_name: str | None,
+        quiet_from: time | None,
+        quiet_to: time | None,
+    ):
+        """Отправляет утренний пинг пользователю (данные пользователя берутся из args задания)."""
+        # Проверяем тихие часы
+        if self._is_quiet_hours(tz_name, quiet_from, quiet_to):
+            logger.info(f"Skipping morning ping for user {user_id} - quiet hours")
+            return
 
-            message = get_phrase("morning_greeting", first_name=user.first_name)
+        message = get_phrase("morning_greeting", first_name=first_name)
 
-            try:
-                await self.bot.send_message(user_id, message)
-                logger.info(f"Sent morning ping to user {user_id}")
-            except Exception as e:
-                logger.error(f"Failed to send morning ping to user {user_id}: {e}")
+        try:
+            await self._send_one(user_id, message)
+            logger.info(f"Sent morning ping to user {user_id}")
+        except Exception as e:
+            logger.error(f"Failed to send morning ping to user {user_id}: {e}")
 
-    async def _send_evening_report(self, user_id: int):
+    async def _send_evening_report(
+        self, user_id: int, tz_name: str | None, quiet_from: time | None, quiet_to: time | None
+    ):
         """Отправляет запрос на вечерний отчёт."""
-        from datetime import date as dt_date
-
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        from db import HabitCompletion, Task
-        from utils import get_phrase
+        if self._is_quiet_hours(tz_name, quiet_from, quiet_to):
+            logger.info(f"Skipping evening report for user {user_id} - quiet hours")
+            return
 
         async with SessionLocal() as session:
-            result = await session.execute(select(User).where(User.user_id == user_id))
-            user = result.scalar_one_or_none()
-            if not user:
-                return
-
-            if await self._is_quiet_hours(user):
-                logger.info(f"Skipping evening report for user {user_id} - quiet hours")
-                return
-
-            # Получаем статистику по привычкам
-            # Всего активных привычек
+            # Получаем статистику по привычкам и задачам одним запросом (считает БД)
+            today = date.today()
             result = await session.execute(
-                select(Habits).where(Habits.user_id == user_id, Habits.active.is_(True))
-            )
-            total = len(result.scalars().all())
-
-            # Выполненных сегодня
-            today = dt_date.today()
-            result = await session.execute(
-                select(HabitCompletion).where(
-                    HabitCompletion.user_id == user_id,
-                    HabitCompletion.completion_date == today,
-                    HabitCompletion.status == "done",
+                select(
+                    # Всего активных привычек
+                    select(func.count())
+                    .select_from(Habits)
+                    .where(Habits.user_id == user_id, Habits.active.is_(True))
+                    .scalar_subquery(),
+                    # Выполненных сегодня
+                    select(func.count())
+                    .select_from(HabitCompletion)
+                    .where(
+                        HabitCompletion.user_id == user_id,
+                        HabitCompletion.completion_date == today,
+                        HabitCompletion.status == "done",
+                    )
+                    .scalar_subquery(),
+                    # Всего задач
+                    select(func.count()).select_from(Task).where(Task.user_id == user_id).scalar_subquery(),
+                    # Выполненных задач
+                    select(func.count())
+                    .select_from(Task)
+                    .where(Task.user_id == user_id, Task.status == "done")
+                    .scalar_subquery(),
                 )
             )
-            done = len(result.scalars().all())
+            total, done, tasks_total, tasks_done = result.one()
 
-            # Получаем статистику по задачам
-            # Всего задач
-            result = await session.execute(select(Task).where(Task.user_id == user_id))
-            tasks_total = len(result.scalars().all())
+        message = get_phrase(
+            "evening_summary", done=done, total=total, tasks_done=tasks_done, tasks_total=tasks_total
+        )
 
-            # Выполненных задач
-            result = await session.execute(select(Task).where(Task.user_id == user_id, Task.status == "done"))
-            tasks_done = len(result.scalars().all())
+        # Сессия БД уже закрыта - соединение не держится, пока отправка ждёт своей очереди
+        try:
+            await self._send_one(user_id, message, reply_markup=_EVENING_MARKUP)
+            logger.info(f"Sent evening report to user {user_id}")
+        except Exception as e:
+            logger.error(f"Failed to send evening report to user {user_id}: {e}")
 
-            message = get_phrase(
-                "evening_summary", done=done, total=total, tasks_done=tasks_done, tasks_total=tasks_total
-            )
+    async def _send_habit_reminder(self, habit: HabitSnapshot):
+        """Отправляет напоминание о привычке."""
+        user_id, habit_id = habit.user_id, habit.habit_id
 
-            builder = InlineKeyboardBuilder()
-            builder.button(text="Заполню текстом ✍️", callback_data="J_ADD")
-            builder.button(text="Пропустить сегодня", callback_data="J_SKIP")
-            builder.adjust(1)
+        if self._is_quiet_hours(habit.tz, habit.quiet_from, habit.quiet_to):
+            logger.info(f"Skipping habit reminder for user {user_id}, " f"habit {habit_id} - quiet hours")
+            return
 
-            try:
-                await self.bot.send_message(user_id, message, reply_markup=builder.as_markup())
-                logger.info(f"Sent evening report to user {user_id}")
-            except Exception as e:
-                logger.error(f"Failed to send evening report to user {user_id}: {e}")
+        # Формируем сообщение
+        today = date.today()
+        date_str = format_date(today, "YYYYMMDD")
+        time_str = habit.time_of_day.strftime("%H:%M") if habit.time_of_day else ""
 
-    async def _send_habit_reminder(self, user_id: int, habit_id: int):
-        """Отправляет напоминание о привычке."""
-        from datetime import date as dt_date
+        # Базовое сообщение
+        message = f"🔔 <b>{habit.title}</b> ({time_str})\n\n"
 
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        from db import HabitTemplate
-        from llm_service import llm_service
-        from utils import format_date
+        # Если нужен контент - генерируем
+        if habit.include_content:
+            # Индикатор "печатает" отправляется параллельно с получением контента
+            typing_task = asyncio.create_task(self.bot.send_chat_action(user_id, "typing"))
+            try:
+                # Из БД нужен только шаблон (пользователь и привычка - в снимке)
+                template = await self._load_template(habit.template_id)
 
-        async with SessionLocal() as session:
-            result = await session.execute(select(User).where(User.user_id == user_id))
-            user = result.scalar_one_or_none()
-            habit = await session.get(Habits, habit_id)
+                # Проверяем, является ли это языковой привычкой
+                if template and template.category in ("language_reading", "language_grammar"):
+                    # Языковая привычка - берём заготовленный контент или получаем из Language API
+                    content = self._content_cache.pop((habit_id, date_str), None)
+                    if content is None:
+                        async with SessionLocal() as session:
+                            content = await self._get_language_content(
+                                session, user_id, habit.language_habit_id
+                            )
+                else:
+                    # Обычная привычка - берём результат пре-генерации или генерируем через LLM
+                    habit_content = llm_service.get_cached_content(habit_id)
+                    if habit_content is None:
+                        async with self._llm_sema:
+                            habit_content = await llm_service.generate_habit_content(
+                                habit_id=habit_id,
+                                habit_title=habit.title,
+                                template=template,
+                                custom_prompt=habit.content_prompt,
+                            )
+                    content = habit_content.content
+                    # Отмечаем, что контент был использован
+                    await llm_service.mark_content_used(habit_content.id)
+
+                # Добавляем контент к сообщению
+                message += f"{content}\n\n"
+
+                logger.info(f"Generated content for habit {habit_id}: {content[:50]}...")
+            except Exception as e:
+                logger.error(f"Failed to generate content for habit {habit_id}: {e}")
+                # Продолжаем без контента
 
-            if not user or not habit or not habit.active:
-                return
+            # Ошибка индикатора не должна мешать отправке напоминания
+            (typing_result,) = await asyncio.gather(typing_task, return_exceptions=True)
+            if isinstance(typing_result, Exception):
+                logger.debug(f"Failed to send typing action to user {user_id}: {typing_result}")
 
-            if await self._is_quiet_hours(user):
-                logger.info(f"Skipping habit reminder for user {user_id}, " f"habit {habit_id} - quiet hours")
-                return
+        message += "Отметишь?"
 
-            # Формируем сообщение
-            today = dt_date.today()
-            date_str = format_date(today, "YYYYMMDD")
-            time_str = habit.time_of_day.strftime("%H:%M") if habit.time_of_day else ""
-
-            # Базовое сообщение
-            message = f"🔔 <b>{habit.title}</b> ({time_str})\n\n"
-
-            # Если нужен контент - генерируем
-            if habit.include_content:
-                try:
-                    # Получаем шаблон, если он есть
-                    template = None
-                    if habit.template_id:
-                        template = await session.get(HabitTemplate, habit.template_id)
-
-                    # Проверяем, является ли это языковой привычкой
-                    if template and template.category in ("language_reading", "language_grammar"):
-                        # Языковая привычка - получаем контент из Language API
-                        content = await self._get_language_content(session, habit)
-                    else:
-                        # Обычная привычка - генерируем контент через LLM
-                        content = await llm_service.generate_habit_content(
-                            habit_id=habit.id,
-                            habit_title=habit.title,
-                            template=template,
-                            custom_prompt=habit.content_prompt,
-                        )
-                        # Отмечаем, что контент был использован
-                        await llm_service.mark_content_used(habit.id, content)
-
-                    # Добавляем контент к сообщению
-                    message += f"{content}\n\n"
-
-                    logger.info(f"Generated content for habit {habit_id}: {content[:50]}...")
-                except Exception as e:
-                    logger.error(f"Failed to generate content for habit {habit_id}: {e}")
-                    # Продолжаем без контента
-
-            message += "Отметишь?"
-
-            builder = InlineKeyboardBuilder()
-            builder.button(text="Сделал ✅", callback_data=f"H_D:{habit_id}:{date_str}")
-            builder.button(text="Отложить 15м ⏰", callback_data=f"H_Z:{habit_id}:15")
-            builder.button(text="Пропустить ➖", callback_data=f"H_S:{habit_id}:{date_str}")
-            builder.adjust(1)
+        try:
+            await self._send_one(user_id, message, reply_markup=_habit_markup(habit_id, date_str))
+            logger.info(f"Sent habit reminder to user {user_id}, habit {habit_id}")
+        except Exception as e:
+            logger.error(f"Failed to send habit reminder to user {user_id}, " f"habit {habit_id}: {e}")
+
+    async def _wait_send_slot(self):
+        """Ждёт своей очереди на отправку, чтобы не превышать глобальный лимит Bot API."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        send_at = max(now, self._next_send_at)
+        self._next_send_at = send_at + _SEND_INTERVAL
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+    async def _load_template(self, template_id: int | None) -> HabitTemplate | None:
+        """
+        Загружает шаблон привычки в отдельной короткой сессии.
 
-            try:
-                await self.bot.send_message(user_id, message, reply_markup=builder.as_markup())
-                logger.info(f"Sent habit reminder to user {user_id}, habit {habit_id}")
-            except Exception as e:
-                logger.error(f"Failed to send habit reminder to user {user_id}, " f"habit {habit_id}: {e}")
+        Сессия закрывается до ожидания _llm_sema и запроса к LLM: генерация сама открывает
+        сессии, и напоминания одной минуты, держащие по соединению, исчерпали бы пул.
+        """
+        if not template_id:
+            return None
+        async with SessionLocal() as session:
+            return await session.get(HabitTemplate, template_id)
 
-    async def _get_language_content(self, session, habit: Habits) -> str:
+    async def _send_one(self, user_id: int, text: str, **kwargs):
+        """Отправляет сообщение пользователю в темпе Bot API, повторяя попытку после flood control."""
+        for attempt in range(1, _SEND_ATTEMPTS + 1):
+            await self._wait_send_slot()
+            try:
+                await self.bot.send_message(user_id, text, **kwargs)
+                return
+            except TelegramRetryAfter as e:
+                if attempt == _SEND_ATTEMPTS:
+                    raise
+                logger.warning(f"Flood control on message to user {user_id}, retrying in {e.retry_after}s")
+                # Ограничение действует на весь бот - откладываем и остальные отправки
+                resume_at = asyncio.get_running_loop().time() + e.retry_after
+                self._next_send_at = max(self._next_send_at, resume_at)
+
+    async def _get_language_content(self, session, user_id: int, language_habit_id: int | None) -> str:
         """
         Получает контент из Language API для языковой привычки.
 
         Args:
             session: Database session
-            habit: Объект привычки с установленным language_habit_id
+            user_id: Telegram user ID владельца привычки
+            language_habit_id: ID связанной LanguageHabit (из Habits.language_habit_id)
 
         Returns:
             Сгенерированный контент для отправки пользователю
         """
-        from api.language_api import get_user_language_api
-        from db import LanguageHabit, UserLanguageSettings
-
-        user_id = habit.user_id
-
         # Получаем API клиент для пользователя
-        api = await get_user_language_api(session, user_id)
+        api = await get_user_language_api(session, user_id, await self._get_http())
 
         if not api:
             return (
@@ -480,12 +720,12 @@ class ReminderScheduler:
             )
 
         # Проверяем наличие language_habit_id
-        if not habit.language_habit_id:
+        if not language_habit_id:
             return "⚠️ Привычка не связана с книгой.\n" "Пересоздай привычку через /addhabit и выбери книгу."
 
         try:
             # Получаем LanguageHabit по ID (вместо поиска по user_id)
-            lang_habit = await session.get(LanguageHabit, habit.language_habit_id)
+            lang_habit = await session.get(LanguageHabit, language_habit_id)
 
             if not lang_habit:
                 return "❌ Ошибка: языковая привычка не найдена."
@@ -582,48 +822,167 @@ class ReminderScheduler:
         except Exception as e:
             logger.error(f"Failed to fetch language content for user {user_id}, category {category}: {e}")
             return f"❌ Ошибка при получении контента: {str(e)[:100]}"
-        finally:
-            # Закрываем API клиент
-            await api.close()
 
-    async def _is_quiet_hours(self, user: User) -> bool:
-        """Проверяет, находится ли текущее время в тихих часах пользователя."""
-        if not user.quiet_hours_from or not user.quiet_hours_to:
+    def _is_quiet_hours(self, tz_name: str | None, quiet_from: time | None, quiet_to: time | None) -> bool:
+        """Проверяет, находится ли текущее время в тихих часах пользователя (снимок из _quiet_snapshot)."""
+        if not quiet_from or not quiet_to:
             return False
 
-        tz = ZoneInfo(user.tz) if user.tz else ZoneInfo("UTC")
-        now = datetime.now(tz).time()
-
-        quiet_from = user.quiet_hours_from
-        quiet_to = user.quiet_hours_to
+        # Сравниваем минуты от начала местных суток - целочисленная арифметика без datetime.now(tz)
+        now_ts = int(unix_time())
+        now = (now_ts // 60 + _utc_offset_minutes(tz_name, now_ts // _OFFSET_BUCKET_SECONDS)) % 1440
+        start = quiet_from.hour * 60 + quiet_from.minute
+        end = quiet_to.hour * 60 + quiet_to.minute
 
         # Обработка случая, когда тихие часы пересекают полночь
-        if quiet_from > quiet_to:
-            return now >= quiet_from or now < quiet_to
+        if start > end:
+            return now >= start or now < end
         else:
-            return quiet_from <= now < quiet_to
+            return start <= now < end
+
+    def _tick_add(self, user_id: int, job_id: str, tz_name: str | None, at: time, entry: _TickEntry):
+        """Кладёт запись в корзину (tz, минута местных суток), заменяя прежнюю запись с тем же id."""
+        # Часовой пояс разрешается в общем ежеминутном тике: один некорректный tz в профиле
+        # остановил бы напоминания всех пользователей, поэтому такую запись не планируем
+        try:
+            get_tz(tz_name)
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            logger.error(f"Invalid timezone {tz_name!r} for {job_id}, not scheduling: {e}")
+            self._discard_jobs(user_id, job_id)
+            return
+
+        self._tick_remove(job_id)
+        slot = (tz_name, at.hour * 60 + at.minute)
+        self._ticks[slot][job_id] = entry
+        self._tick_slots[job_id] = slot
+        self._tick_tzs[tz_name] += 1
+        self.user_jobs[user_id].add(job_id)
+
+    def _tick_remove(self, job_id: str) -> bool:
+        """Убирает запись из корзины диспетчера; False - записи не было."""
+        slot = self._tick_slots.pop(job_id, None)
+        if slot is None:
+            return False
+
+        bucket = self._ticks[slot]
+        del bucket[job_id]
+        if not bucket:
+            del self._ticks[slot]
+
+        tz_name = slot[0]
+        self._tick_tzs[tz_name] -= 1
+        if not self._tick_tzs[tz_name]:
+            del self._tick_tzs[tz_name]
+        return True
+
+    def _due_entries(self, minute: int) -> list[_TickEntry]:
+        """Записи, которые должны сработать в минуту minute (минуты от начала эпохи UTC)."""
+        due = []
+        for tz_name in self._tick_tzs:
+            offset = _offset_at_minute(tz_name, minute)
+            local = minute + offset
+            locals_due = [local]
+
+            # Смена смещения не бывает чаще раза в несколько часов: сравниваем с тем, что было 3 часа назад
+            prev_offset = _offset_at_minute(tz_name, minute - 180)
+            shift = offset - prev_offset
+            if shift and _offset_at_minute(tz_name, minute - abs(shift)) == prev_offset:
+                if shift < 0:
+                    # Часы переведены назад и эта местная минута уже была - второй раз не срабатываем
+                    continue
+                # Часы переведены вперёд: местной минуты local - shift не было, её записи
+                # срабатывают со сдвигом на величину перевода (как CronTrigger: 02:30 -> 03:30)
+                locals_due.append(local - shift)
+
+            for local_minute in locals_due:
+                entries = self._ticks.get((tz_name, local_minute % 1440))
+                if not entries:
+                    continue
+                # День недели по местному времени: 01.01.1970 - четверг (3)
+                weekday = (local_minute // 1440 + 3) % 7
+                due.extend(entry for entry in entries.values() if entry.days is None or weekday in entry.days)
+        return due
+
+    async def _tick(self):
+        """Ежеминутно запускает напоминания, местное время которых наступило."""
+        now_minute = int(unix_time()) // 60
+        last = self._last_tick_minute
+        # Догоняем минуты, пропущенные из-за задержки срабатывания (но не больше допустимого опоздания)
+        first = now_minute if last is None else max(last + 1, now_minute - _TICK_CATCHUP_MINUTES)
+        if last is None or now_minute > last:
+            self._last_tick_minute = now_minute
+
+        due = []
+        for minute in range(first, now_minute + 1):
+            due.extend(self._due_entries(minute))
+        if not due:
+            return
+
+        # Пачка выполняется отдельной задачей: долгая генерация контента не должна
+        # задерживать следующий тик (max_instances=1)
+        task = asyncio.create_task(self._run_tick_batch(due))
+        self._tick_tasks.add(task)
+        task.add_done_callback(self._tick_tasks.discard)
+
+    async def _run_tick_batch(self, due: list[_TickEntry]):
+        """Одновременно выполняет напоминания одной минуты."""
+        results = await asyncio.gather(
+            *(entry.callback(*entry.args) for entry in due), return_exceptions=True
+        )
+        for entry, result in zip(due, results, strict=True):
+            if isinstance(result, Exception):
+                logger.error(f"Reminder {entry.callback.__name__} failed: {result}")
+
+    def _discard_jobs(self, user_id: int, *job_ids: str):
+        """Снимает записи пользователя с расписания, если они есть."""
+        user_job_ids = self.user_jobs.get(user_id)
+        for job_id in job_ids:
+            if user_job_ids is not None:
+                user_job_ids.discard(job_id)
+            self._tick_remove(job_id)
+
+        # Не оставляем в индексе пустые записи пользователей без заданий
+        if user_job_ids is not None and not user_job_ids:
+            del self.user_jobs[user_id]
+
+    def list_jobs_for_user(self, user_id: int) -> list[str]:
+        """Возвращает id запланированных напоминаний пользователя по индексу user_jobs."""
+        return sorted(self.user_jobs.get(user_id, ()))
 
     def remove_user_jobs(self, user_id: int):
         """Удаляет все задачи пользователя из планировщика."""
-        jobs_to_remove = []
+        removed = 0
 
-        for job in self.scheduler.get_jobs():
-            if str(user_id) in job.id:
-                jobs_to_remove.append(job.id)
+        # Индекс содержит только задания этого пользователя - фильтрация по id не нужна
+        for job_id in self.user_jobs.pop(user_id, ()):
+            removed += self._tick_remove(job_id)
 
-        for job_id in jobs_to_remove:
-            self.scheduler.remove_job(job_id)
-
-        logger.info(f"Removed {len(jobs_to_remove)} jobs for user {user_id}")
+        logger.info(f"Removed {removed} jobs for user {user_id}")
 
     async def reschedule_all_users(self):
         """Перепланирует напоминания для всех пользователей (при старте бота)."""
+        # Онбординг пройден - язык выбран
+        onboarded = (User.lang.is_not(None), User.lang != "")
+
+        users_count = 0
+
+        # Два запроса на всех пользователей вместо двух запросов на каждого
         async with SessionLocal() as session:
-            result = await session.execute(select(User))
-            users = result.scalars().all()
+            result = await session.execute(
+                select(Habits)
+                .join(User, User.user_id == Habits.user_id)
+                .where(Habits.active.is_(True), *onboarded)
+            )
+            habits_by_user: dict[int, list[Habits]] = defaultdict(list)
+            for habit in result.scalars():
+                habits_by_user[habit.user_id].append(habit)
 
-            for user in users:
-                if user.lang:  # Онбординг пройден
-                    await self.schedule_user_reminders(user.user_id)
+            # Пользователи читаются потоком пачками по 500, а не загружаются в память целиком
+            users = await session.stream(
+                select(*_SCHEDULE_USER_COLUMNS).where(*onboarded).execution_options(yield_per=500)
+            )
+            async for user in users:
+                await self._schedule_user_reminders_prefetched(user, habits_by_user.pop(user.user_id, []))
+                users_count += 1
 
-        logger.info(f"Rescheduled reminders for {len(users)} users")
+        logger.info(f"Rescheduled reminders for {users_count} users")
@@ -6,7 +6,10 @@ from .helpers import (
     format_percent,
     format_time,
     get_phrase,
+    get_phrase_templates,
+    get_tz,
     load_phrases,
+    local_day_bounds,
     make_progress_bar,
 )
 from .validators import (
@@ -30,6 +33,9 @@ __all__ = [
     "format_percent",
     "format_time",
     "get_phrase",
+    "get_phrase_templates",
+    "get_tz",
     "load_phrases",
+    "local_day_bounds",
     "make_progress_bar",
 ]
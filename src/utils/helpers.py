@@ -2,20 +2,44 @@
 
 import json
 import random
+from datetime import UTC, datetime, time, timedelta
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
+from zoneinfo import ZoneInfo
 
+_LOCALES_DIR = Path(__file__).parent.parent.parent / "locales"
 
-def load_phrases(lang: str = "ru") -> dict[str, list[str]]:
-    """Загружает фразы из JSON файла для указанного языка."""
-    phrases_path = Path(__file__).parent.parent.parent / "locales" / f"phrases_{lang}.json"
+
+@lru_cache(maxsize=8)
+def load_phrases(lang: str = "ru") -> dict[str, tuple[str, ...]]:
+    """
+    Загружает фразы из JSON файла для указанного языка.
+
+    Файл читается один раз на язык; для перечитывания локалей без перезапуска
+    вызовите load_phrases.cache_clear() и get_phrase_templates.cache_clear().
+    Возвращаемый словарь общий для всех вызовов - не изменяйте его;
+    варианты фраз хранятся неизменяемыми кортежами.
+    """
+    phrases_path = _LOCALES_DIR / f"phrases_{lang}.json"
 
     if not phrases_path.exists():
         # Fallback to Russian if language not found
-        phrases_path = Path(__file__).parent.parent.parent / "locales" / "phrases_ru.json"
+        phrases_path = _LOCALES_DIR / "phrases_ru.json"
 
     with open(phrases_path, encoding="utf-8") as f:
-        return json.load(f)
+        return {key: tuple(variants) for key, variants in json.load(f).items()}
+
+
+@lru_cache(maxsize=256)
+def get_phrase_templates(key: str, lang: str = "ru") -> tuple[str, ...]:
+    """
+    Возвращает варианты шаблона фразы по ключу (кэшируется по ключу и языку).
+
+    Подстановка параметров выполняется отдельно, поэтому кэш не зависит от kwargs.
+    Для отсутствующего ключа возвращает пустой кортеж.
+    """
+    return load_phrases(lang).get(key, ())
 
 
 def get_phrase(key: str, lang: str = "ru", **kwargs: Any) -> str:
@@ -34,13 +58,12 @@ def get_phrase(key: str, lang: str = "ru", **kwargs: Any) -> str:
         >>> get_phrase("habit_done", title="Чтение", date="25.10.2025", emoji="🔥")
         "Отлично, зачёл «Чтение» за 25.10.2025 🔥"
     """
-    phrases = load_phrases(lang)
+    templates = get_phrase_templates(key, lang)
 
-    if key not in phrases:
+    if not templates:
         return f"[Missing phrase: {key}]"
 
-    phrase_list = phrases[key]
-    selected_phrase = random.choice(phrase_list)
+    selected_phrase = random.choice(templates)
 
     return selected_phrase.format(**kwargs)
 
@@ -138,6 +161,39 @@ def format_time(time_obj) -> str:
     return time_obj.strftime("%H:%M")
 
 
+@lru_cache(maxsize=512)
+def get_tz(tz_name: str | None) -> ZoneInfo:
+    """
+    Возвращает ZoneInfo для часового пояса пользователя (UTC, если не задан).
+
+    Результат кэшируется по имени: часовые пояса нужны при каждом планировании
+    и срабатывании напоминаний, а набор поясов пользователей невелик.
+    """
+    return ZoneInfo(tz_name) if tz_name else ZoneInfo("UTC")
+
+
+def local_day_bounds(tz_name: str | None, days_ago: int = 0) -> tuple[datetime, datetime]:
+    """
+    Вычисляет границы локального дня пользователя в UTC.
+
+    Args:
+        tz_name: Часовой пояс пользователя (например, 'Europe/Moscow'), None - UTC
+        days_ago: На сколько дней назад сдвинуть (0 - сегодня, 1 - вчера)
+
+    Returns:
+        Tuple (start_utc, end_utc) - полуинтервал [start, end) для запросов по диапазону
+
+    Example:
+        >>> local_day_bounds("Asia/Tokyo")  # если в Токио сейчас 25.10.2025
+        (datetime(2025, 10, 24, 15, 0, tzinfo=UTC), datetime(2025, 10, 25, 15, 0, tzinfo=UTC))
+    """
+    tz = get_tz(tz_name)
+    day = datetime.now(tz).date() - timedelta(days=days_ago)
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+    return start.astimezone(UTC), end.astimezone(UTC)
+
+
 def calculate_percent(done: int, total: int) -> float:
     """
     Вычисляет процент выполнения.
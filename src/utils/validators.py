@@ -4,6 +4,9 @@ import html
 import re
 from datetime import datetime, time
 
+# Регулярное выражение компилируется один раз при импорте модуля
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_\-\.=]+$")
+
 
 def escape_html(text: str) -> str:
     """
@@ -33,26 +36,16 @@ def validate_time_format(time_str: str) -> tuple[bool, str | None]:
     if not time_str:
         return False, "Время не может быть пустым"
 
-    pattern = r"^([0-1]?[0-9]|2[0-3]):[0-5][0-9]$"
-    if not re.match(pattern, time_str):
-        return False, "Неверный формат. Используйте HH:MM (например, 08:00)"
-
-    # Дополнительная проверка: парсим время
+    # strptime за один проход проверяет и формат, и диапазоны часов/минут; минуты он принимает
+    # и однозначные ("8:5"), а строка сохраняется как есть - их длину проверяем отдельно
     try:
-        parts = time_str.split(":")
-        hour = int(parts[0])
-        minute = int(parts[1])
-
-        if not (0 <= hour <= 23):
-            return False, "Часы должны быть от 0 до 23"
-
-        if not (0 <= minute <= 59):
-            return False, "Минуты должны быть от 0 до 59"
-
-        return True, None
+        datetime.strptime(time_str, "%H:%M")
+    except ValueError:
+        return False, "Неверный формат. Используйте HH:MM (например, 08:00)"
+    if len(time_str.partition(":")[2]) != 2:
+        return False, "Неверный формат. Используйте HH:MM (например, 08:00)"
 
-    except (ValueError, IndexError):
-        return False, "Не удалось распарсить время"
+    return True, None
 
 
 def validate_time_sequence(
@@ -89,9 +82,7 @@ def validate_time_sequence(
         # Проверяем разумные интервалы (хотя бы 30 минут между этапами)
         def time_diff_minutes(t1: time, t2: time) -> int:
             """Разница между двумя временами в минутах"""
-            dt1 = datetime.combine(datetime.today(), t1)
-            dt2 = datetime.combine(datetime.today(), t2)
-            return int((dt2 - dt1).total_seconds() / 60)
+            return (t2.hour - t1.hour) * 60 + (t2.minute - t1.minute)
 
         audio_to_reading = time_diff_minutes(audio_t, reading_t)
         reading_to_questions = time_diff_minutes(reading_t, questions_t)
@@ -130,8 +121,9 @@ def sanitize_text_input(text: str, max_length: int = 5000) -> str:
     if not text:
         return ""
 
-    # Убираем лишние пробелы
-    text = text.strip()
+    # Убираем лишние пробелы (только если они есть - чистый текст не копируем)
+    if text[0].isspace() or text[-1].isspace():
+        text = text.strip()
 
     # Обрезаем до максимальной длины
     if len(text) > max_length:
@@ -162,7 +154,7 @@ def validate_api_token(token: str) -> tuple[bool, str | None]:
 
     # Проверяем, что токен не содержит подозрительных символов
     # (обычно токены - это hex, base64 или alphanumeric)
-    if not re.match(r"^[A-Za-z0-9_\-\.=]+$", token):
+    if not _TOKEN_RE.match(token):
         return (
             False,
             "Токен содержит недопустимые символы. " "Токены обычно содержат только буквы, цифры, и _-.",
@@ -0,0 +1,121 @@
+"""Тесты запросов к БД на SQLite в памяти."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import db
+from db import Base, LanguageProgress, json_set_key, language_progress_for_day, upsert
+
+
+@asynccontextmanager
+async def _memory_session():
+    """Сессия к пустой SQLite БД в памяти со схемой приложения."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            yield session
+    finally:
+        await engine.dispose()
+
+
+async def _progress_for_day(rows: list[LanguageProgress], day_start: datetime) -> LanguageProgress | None:
+    async with _memory_session() as session:
+        session.add_all(rows)
+        await session.commit()
+        return await session.scalar(language_progress_for_day(1, day_start, day_start + timedelta(days=1)))
+
+
+def test_language_progress_for_day_prefers_day_start_row():
+    day_start = datetime(2025, 6, 1, 21, 0, tzinfo=UTC)
+    rows = [
+        # Запись до перехода на local_day_bounds - момент создания, а не начало дня
+        LanguageProgress(habit_id=1, date=day_start + timedelta(hours=3, minutes=17), words_read=50),
+        LanguageProgress(habit_id=1, date=day_start, words_read=120),
+        # Запись предыдущего дня - вне диапазона
+        LanguageProgress(habit_id=1, date=day_start - timedelta(hours=3), words_read=10),
+    ]
+
+    progress = asyncio.run(_progress_for_day(rows, day_start))
+
+    assert progress.words_read == 120
+
+
+def test_language_progress_for_day_falls_back_to_earliest_row():
+    day_start = datetime(2025, 6, 1, 21, 0, tzinfo=UTC)
+    rows = [
+        LanguageProgress(habit_id=1, date=day_start + timedelta(hours=5), words_read=30),
+        LanguageProgress(habit_id=1, date=day_start + timedelta(hours=2), words_read=70),
+        LanguageProgress(habit_id=2, date=day_start, words_read=999),
+    ]
+
+    progress = asyncio.run(_progress_for_day(rows, day_start))
+
+    assert progress.words_read == 70
+
+
+def _audio_upsert(day_start: datetime, fragment: dict):
+    """Upsert прогресса за день, как при отправке аудио в language_scheduler."""
+    stmt = upsert(LanguageProgress).values(
+        habit_id=1, date=day_start, audio_sent=True, extra_data={"pending_fragment": fragment}
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["habit_id", "date"],
+        set_={
+            "audio_sent": True,
+            "extra_data": json_set_key(LanguageProgress.extra_data, "pending_fragment", fragment),
+        },
+    )
+
+
+def test_repeated_upserts_merge_into_one_row():
+    day_start = datetime(2025, 6, 1, 21, 0, tzinfo=UTC)
+
+    async def run():
+        async with _memory_session() as session:
+            await session.execute(_audio_upsert(day_start, {"id": 1}))
+            await session.execute(_audio_upsert(day_start, {"id": 2}))
+            await session.commit()
+            return (await session.scalars(select(LanguageProgress.extra_data))).all()
+
+    assert asyncio.run(run()) == [{"pending_fragment": {"id": 2}}]
+
+
+def test_json_set_key_keeps_sibling_keys():
+    async def run():
+        async with _memory_session() as session:
+            session.add(
+                LanguageProgress(
+                    habit_id=1,
+                    date=datetime(2025, 6, 1, tzinfo=UTC),
+                    extra_data={"pending_fragment": {"id": 1}},
+                )
+            )
+            await session.commit()
+            await session.execute(
+                update(LanguageProgress).values(
+                    extra_data=json_set_key(LanguageProgress.extra_data, "questions", [{"q": "Why?"}])
+                )
+            )
+            return await session.scalar(select(LanguageProgress.extra_data))
+
+    assert asyncio.run(run()) == {"pending_fragment": {"id": 1}, "questions": [{"q": "Why?"}]}
+
+
+def test_postgresql_statements_compile(monkeypatch):
+    monkeypatch.setattr(db, "engine", SimpleNamespace(dialect=SimpleNamespace(name="postgresql")))
+
+    sql = str(
+        _audio_upsert(datetime(2025, 6, 1, tzinfo=UTC), {"id": 1}).compile(dialect=postgresql.dialect())
+    )
+
+    assert "ON CONFLICT (habit_id, date) DO UPDATE" in sql
+    assert "jsonb_set(coalesce(CAST(language_progress.extra_data AS JSONB)" in sql
@@ -0,0 +1,106 @@
+"""Тесты ограничения частоты сообщений."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.types import Message, User
+
+import middleware.rate_limit as rate_limit
+from middleware import RateLimitMiddleware
+
+
+class _Clock:
+    """Подменяет time.monotonic в модуле middleware."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    replies = []
+
+    async def reply(self, text, **kwargs):
+        replies.append(self.from_user.id)
+
+    monkeypatch.setattr(Message, "reply", reply)
+    return replies
+
+
+def _send(middleware: RateLimitMiddleware, user_id: int, count: int = 1) -> int:
+    """Отправляет count сообщений от пользователя и возвращает число дошедших до хендлера."""
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.from_user.id)
+
+    async def send_all():
+        for _ in range(count):
+            message = Message.model_construct(from_user=User(id=user_id, is_bot=False, first_name="Test"))
+            await middleware(handler, message, {})
+
+    asyncio.run(send_all())
+    return len(handled)
+
+
+def test_burst_up_to_rate_limit_then_rejected(clock, replies):
+    middleware = RateLimitMiddleware(rate_limit=3, time_window=60)
+
+    assert _send(middleware, 1, count=3) == 3
+    assert _send(middleware, 1) == 0
+    assert replies == [1]
+    # Лимит считается для каждого пользователя отдельно
+    assert _send(middleware, 2) == 1
+
+
+def test_previous_window_count_carries_over(clock, replies):
+    middleware = RateLimitMiddleware(rate_limit=3, time_window=60)
+    _send(middleware, 1, count=3)
+
+    # Середина следующего окна: половина предыдущих запросов ещё учитывается (3 * 0.5 = 1.5)
+    clock.now = 90
+    assert _send(middleware, 1, count=3) == 2
+
+
+def test_counts_reset_after_gap_of_two_windows(clock, replies):
+    middleware = RateLimitMiddleware(rate_limit=3, time_window=60)
+    _send(middleware, 1, count=3)
+
+    clock.now = 120
+    assert _send(middleware, 1, count=3) == 3
+    assert replies == []
+
+
+def test_cleanup_evicts_only_entries_older_than_previous_window(clock, replies):
+    middleware = RateLimitMiddleware(rate_limit=3, time_window=60)
+    _send(middleware, 1)
+    clock.now = 70
+    _send(middleware, 2)
+    clock.now = 130
+    _send(middleware, 3)
+
+    asyncio.run(middleware.cleanup())
+
+    assert list(middleware.user_requests) == [2, 3]
+
+
+def test_least_recent_user_evicted_over_max_users(clock, replies):
+    middleware = RateLimitMiddleware(rate_limit=3, time_window=60, max_users=2)
+    _send(middleware, 1)
+    _send(middleware, 2)
+    # Пользователь 1 пишет снова - теперь самый давний пользователь 2
+    _send(middleware, 1)
+    _send(middleware, 3)
+
+    assert list(middleware.user_requests) == [1, 3]
@@ -0,0 +1,288 @@
+"""Тесты вычислений времени в планировщике напоминаний."""
+
+import asyncio
+import calendar
+from datetime import date, datetime, time
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+import scheduler
+from scheduler import (
+    _OFFSET_BUCKET_SECONDS,
+    HabitSnapshot,
+    ReminderScheduler,
+    _TickEntry,
+    _utc_offset_minutes,
+)
+
+
+def _minute(year: int, month: int, day: int, hour: int, minute: int = 0) -> int:
+    """Минута от начала эпохи UTC, как её считает _tick."""
+    return calendar.timegm((year, month, day, hour, minute, 0)) // 60
+
+
+def _bucket(year: int, month: int, day: int, hour: int, minute: int = 0) -> int:
+    """Интервал _utc_offset_minutes для момента UTC."""
+    return calendar.timegm((year, month, day, hour, minute, 0)) // _OFFSET_BUCKET_SECONDS
+
+
+@pytest.mark.parametrize(
+    ("tz_name", "before", "after", "offset_before", "offset_after"),
+    [
+        # Berlin: переход на летнее время 30.03.2025 в 01:00 UTC
+        ("Europe/Berlin", (2025, 3, 30, 0, 45), (2025, 3, 30, 1, 0), 60, 120),
+        # Berlin: переход на зимнее время 26.10.2025 в 01:00 UTC
+        ("Europe/Berlin", (2025, 10, 26, 0, 45), (2025, 10, 26, 1, 0), 120, 60),
+        # New York: переход на летнее время 09.03.2025 в 07:00 UTC
+        ("America/New_York", (2025, 3, 9, 6, 45), (2025, 3, 9, 7, 0), -300, -240),
+        # Sydney: переход на летнее время 05.10.2025 в 02:00 местного (04.10 16:00 UTC)
+        ("Australia/Sydney", (2025, 10, 4, 15, 45), (2025, 10, 4, 16, 0), 600, 660),
+    ],
+)
+def test_utc_offset_minutes_around_dst_transition(tz_name, before, after, offset_before, offset_after):
+    assert _utc_offset_minutes(tz_name, _bucket(*before)) == offset_before
+    assert _utc_offset_minutes(tz_name, _bucket(*after)) == offset_after
+
+
+def test_utc_offset_minutes_hours_away_from_transition():
+    # Несколько часов до и после перехода смещение уже/ещё прежнее (а не сдвинутое на величину смещения)
+    assert _utc_offset_minutes("Australia/Sydney", _bucket(2025, 10, 4, 8)) == 600
+    assert _utc_offset_minutes("Australia/Sydney", _bucket(2025, 10, 4, 20)) == 660
+    assert _utc_offset_minutes("America/New_York", _bucket(2025, 3, 9, 4)) == -300
+    assert _utc_offset_minutes("America/New_York", _bucket(2025, 3, 9, 10)) == -240
+
+
+async def _noop(*args):
+    pass
+
+
+@pytest.fixture
+def reminders():
+    return ReminderScheduler(bot=None)
+
+
+def _add(reminders, job_id, tz_name, at, days=None):
+    reminders._tick_add(1, job_id, tz_name, at, _TickEntry(_noop, (job_id,), days))
+
+
+def _due_ids(reminders, minute):
+    return sorted(entry.args[0] for entry in reminders._due_entries(minute))
+
+
+def test_due_entries_fire_at_local_minute(reminders):
+    _add(reminders, "moscow", "Europe/Moscow", time(9, 0))
+    _add(reminders, "utc", None, time(9, 0))
+
+    assert _due_ids(reminders, _minute(2025, 6, 2, 6, 0)) == ["moscow"]
+    assert _due_ids(reminders, _minute(2025, 6, 2, 9, 0)) == ["utc"]
+    assert _due_ids(reminders, _minute(2025, 6, 2, 6, 1)) == []
+
+
+def test_due_entries_filter_local_weekday(reminders):
+    # Понедельник и среда; в Sydney 09:00 понедельника - это 23:00 воскресенья UTC
+    _add(reminders, "weekly", "Australia/Sydney", time(9, 0), frozenset({0, 2}))
+
+    assert _due_ids(reminders, _minute(2025, 6, 1, 23, 0)) == ["weekly"]
+    assert _due_ids(reminders, _minute(2025, 6, 2, 23, 0)) == []
+    assert _due_ids(reminders, _minute(2025, 6, 3, 23, 0)) == ["weekly"]
+
+
+def test_due_entries_spring_forward(reminders):
+    # Sydney 05.10.2025: 02:00 -> 03:00 местного (04.10 16:00 UTC)
+    _add(reminders, "morning", "Australia/Sydney", time(9, 30))
+    _add(reminders, "gap", "Australia/Sydney", time(2, 30))
+
+    assert _due_ids(reminders, _minute(2025, 10, 4, 22, 30)) == ["morning"]
+    assert _due_ids(reminders, _minute(2025, 10, 4, 23, 30)) == []
+    # Несуществующее 02:30 срабатывает в 03:30 местного
+    assert _due_ids(reminders, _minute(2025, 10, 4, 16, 30)) == ["gap"]
+    assert _due_ids(reminders, _minute(2025, 10, 4, 15, 30)) == []
+
+
+def test_due_entries_fall_back(reminders):
+    # Berlin 26.10.2025: 03:00 -> 02:00 местного (01:00 UTC)
+    _add(reminders, "after", "Europe/Berlin", time(3, 30))
+    _add(reminders, "repeated", "Europe/Berlin", time(2, 30))
+
+    assert _due_ids(reminders, _minute(2025, 10, 26, 2, 30)) == ["after"]
+    assert _due_ids(reminders, _minute(2025, 10, 26, 1, 30)) == []
+    # Повторяющееся 02:30 срабатывает один раз - при первом наступлении
+    assert _due_ids(reminders, _minute(2025, 10, 26, 0, 30)) == ["repeated"]
+
+
+def test_tick_add_skips_invalid_timezone(reminders):
+    _add(reminders, "broken", "Mars/Olympus_Mons", time(9, 0))
+    _add(reminders, "utc", None, time(9, 0))
+
+    assert reminders.list_jobs_for_user(1) == ["utc"]
+    assert _due_ids(reminders, _minute(2025, 6, 2, 9, 0)) == ["utc"]
+
+
+def test_tick_remove_clears_buckets(reminders):
+    _add(reminders, "moscow", "Europe/Moscow", time(9, 0))
+    reminders._discard_jobs(1, "moscow")
+
+    assert not reminders._ticks
+    assert not reminders._tick_tzs
+    assert not reminders.user_jobs
+
+
+class _FloodBot:
+    """Бот, который первые flood_errors отправок отвечает flood control."""
+
+    def __init__(self, flood_errors: int):
+        self.flood_errors = flood_errors
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.flood_errors:
+            self.flood_errors -= 1
+            method = SendMessage(chat_id=chat_id, text=text)
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        self.sent.append((chat_id, text))
+
+
+def test_send_one_retries_after_flood_control():
+    bot = _FloodBot(flood_errors=1)
+    asyncio.run(ReminderScheduler(bot)._send_one(1, "hi"))
+
+    assert bot.sent == [(1, "hi")]
+
+
+def test_send_one_gives_up_after_repeated_flood_control():
+    bot = _FloodBot(flood_errors=10)
+    with pytest.raises(TelegramRetryAfter):
+        asyncio.run(ReminderScheduler(bot)._send_one(1, "hi"))
+
+    assert bot.sent == []
+
+
+def test_send_slots_are_paced():
+    async def reserve_slots():
+        reminders = ReminderScheduler(bot=None)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(reminders._wait_send_slot() for _ in range(4)))
+        return loop.time() - start
+
+    # Четыре отправки подряд занимают не меньше трёх интервалов
+    assert asyncio.run(reserve_slots()) >= 3 / 30 - 0.01
+
+
+class _TemplateSession:
+    """Сессия БД, в которой есть только шаблон языковой привычки."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def get(self, model, pk):
+        return SimpleNamespace(category="language_reading")
+
+
+class _RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_chat_action(self, chat_id, action):
+        pass
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def _content_habit(time_of_day: time, language_habit_id: int | None = None) -> HabitSnapshot:
+    return HabitSnapshot(
+        habit_id=7,
+        user_id=1,
+        title="Привычка",
+        time_of_day=time_of_day,
+        include_content=True,
+        template_id=3,
+        content_prompt=None,
+        language_habit_id=language_habit_id,
+        tz=None,
+        quiet_from=None,
+        quiet_to=None,
+    )
+
+
+def test_content_prefetched_before_midnight_survives_daily_reset(monkeypatch):
+    # Напоминание в 00:02: контент заготовлен в 23:57, в 00:00 сбрасываются дневные кэши
+    class BeforeMidnight(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2025, 6, 1, 23, 57)
+
+    class NextDay(date):
+        @classmethod
+        def today(cls):
+            return cls(2025, 6, 2)
+
+    fetches = []
+
+    async def fetch_language_content(session, user_id, language_habit_id):
+        fetches.append(language_habit_id)
+        return f"fragment {len(fetches)}"
+
+    bot = _RecordingBot()
+    reminders = ReminderScheduler(bot)
+    monkeypatch.setattr(scheduler, "SessionLocal", _TemplateSession)
+    monkeypatch.setattr(reminders, "_get_language_content", fetch_language_content)
+    habit = _content_habit(time(0, 2), language_habit_id=5)
+    # Заготовка за позапрошлый день должна удалиться
+    reminders._content_cache[(8, "20250531")] = "stale"
+
+    monkeypatch.setattr(scheduler, "datetime", BeforeMidnight)
+    asyncio.run(reminders._pregenerate_habit_content(habit))
+
+    monkeypatch.setattr(scheduler, "date", NextDay)
+    reminders._reset_daily_caches()
+    asyncio.run(reminders._send_habit_reminder(habit))
+
+    assert fetches == [5]
+    assert "fragment 1" in bot.sent[0][1]
+    assert reminders._content_cache == {}
+
+
+def test_llm_content_is_generated_without_open_db_session(monkeypatch):
+    open_sessions = []
+    generated_with = []
+
+    class CountingSession(_TemplateSession):
+        async def __aenter__(self):
+            open_sessions.append(self)
+            return self
+
+        async def __aexit__(self, *exc_info):
+            open_sessions.remove(self)
+            return False
+
+        async def get(self, model, pk):
+            return SimpleNamespace(category="motivation")
+
+    async def generate_habit_content(**kwargs):
+        generated_with.append(len(open_sessions))
+        return SimpleNamespace(id=1, content="совет дня")
+
+    async def mark_content_used(content_id):
+        pass
+
+    monkeypatch.setattr(scheduler, "SessionLocal", CountingSession)
+    monkeypatch.setattr(scheduler.llm_service, "generate_habit_content", generate_habit_content)
+    monkeypatch.setattr(scheduler.llm_service, "get_cached_content", lambda habit_id: None)
+    monkeypatch.setattr(scheduler.llm_service, "mark_content_used", mark_content_used)
+    bot = _RecordingBot()
+    reminders = ReminderScheduler(bot)
+    habit = _content_habit(time(9, 0))
+
+    asyncio.run(reminders._pregenerate_habit_content(habit))
+    asyncio.run(reminders._send_habit_reminder(habit))
+
+    assert generated_with == [0, 0]
+    assert "совет дня" in bot.sent[0][1]
@@ -0,0 +1,18 @@
+"""Тесты валидаторов пользовательского ввода."""
+
+import pytest
+
+from utils.validators import validate_time_format
+
+
+@pytest.mark.parametrize("time_str", ["08:00", "8:05", "23:59", "00:00"])
+def test_validate_time_format_accepts_hh_mm(time_str):
+    assert validate_time_format(time_str) == (True, None)
+
+
+@pytest.mark.parametrize("time_str", ["", "8:5", "08:5", "24:00", "12:60", "12-30", "12:300", "noon"])
+def test_validate_time_format_rejects_invalid(time_str):
+    is_valid, error = validate_time_format(time_str)
+
+    assert not is_valid
+    assert error